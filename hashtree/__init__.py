@@ -1,6 +1,23 @@
 """Top-level package for hashtree."""
 
-from .cli import cli, hashtree
+from .api import iter_digests
+from .cli import check_tree, cli, hashtree, list_duplicates, merge_shards, watch_listing
+from .formats import BinaryReader, DigestRecord, read_binary
 from .version import __author__, __email__, __timestamp__, __version__
 
-__all__ = ["cli", "hashtree", "__version__", "__timestamp__", "__author__", "__email__"]
+__all__ = [
+    "cli",
+    "hashtree",
+    "check_tree",
+    "list_duplicates",
+    "merge_shards",
+    "watch_listing",
+    "iter_digests",
+    "BinaryReader",
+    "DigestRecord",
+    "read_binary",
+    "__version__",
+    "__timestamp__",
+    "__author__",
+    "__email__",
+]
@@ -0,0 +1,94 @@
+"""asyncio engine for trees where open and read latency dominates"""
+
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# pool: each job opens, reads and hashes one file at a time
+# asyncio: up to concurrency files are opened and read at once, hashing on jobs workers
+ENGINES = ["pool", "asyncio"]
+
+DEFAULT_ENGINE = "pool"
+
+DEFAULT_CONCURRENCY = 64
+
+
+def _open(path):
+    ifp = open(path, "rb", buffering=0)
+    return ifp, os.fstat(ifp.fileno()).st_size
+
+
+async def _cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _update(hashers, block):
+    for hasher in hashers:
+        hasher.update(block)
+
+
+class AsyncHasher:
+    """hash files with opens and reads in flight on many threads and hashing on a few"""
+
+    def __init__(self, hasher, reader, worker):
+        self.hasher = hasher
+        self.reader = reader
+        self.worker = worker
+
+    async def digests(self, filename):
+        loop = asyncio.get_running_loop()
+        ifp, size = await loop.run_in_executor(self.reader, _open, self.hasher.base_path / filename)
+        try:
+            hashers = [new() for new in self.hasher._hashes]
+            # small files need no more than one short read past their end
+            view = memoryview(bytearray(max(1, min(self.hasher.block_size, size + 1))))
+            while count := await loop.run_in_executor(self.reader, ifp.readinto, view):
+                await loop.run_in_executor(self.worker, _update, hashers, view[:count])
+        finally:
+            await loop.run_in_executor(self.reader, ifp.close)
+        return tuple(hasher.hexdigest() for hasher in hashers)
+
+    async def cached_digest(self, item):
+        filename, digests = item
+        if digests is None:
+            digests = await self.digests(filename)
+        return digests
+
+
+def async_ordered_map(hasher, iterable, jobs=1, concurrency=None):
+    """yield hasher.cached_digest(item) for each item in input order, with up to concurrency files in flight
+
+    Opens, reads and closes run on a pool of concurrency threads so that many
+    round trips to a network filesystem overlap; hashing runs on jobs threads
+    (jobs=0: one per cpu). Files are always read, whatever the hasher's io mode.
+    """
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+
+    loop = asyncio.new_event_loop()
+    reader = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="hashtree-read")
+    worker = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="hashtree-hash")
+    engine = AsyncHasher(hasher, reader, worker)
+    items = iter(iterable)
+    pending = deque()
+    try:
+        for item in islice(items, concurrency):
+            pending.append(loop.create_task(engine.cached_digest(item)))
+        while pending:
+            # running the loop until the oldest task is done also advances every other task
+            result = loop.run_until_complete(pending.popleft())
+            for item in islice(items, 1):
+                pending.append(loop.create_task(engine.cached_digest(item)))
+            yield result
+    finally:
+        loop.run_until_complete(_cancel(pending))
+        loop.close()
+        reader.shutdown(wait=True, cancel_futures=True)
+        worker.shutdown(wait=True, cancel_futures=True)
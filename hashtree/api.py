@@ -0,0 +1,54 @@
+"""streaming digests for use as a library"""
+
+from contextlib import nullcontext
+from pathlib import Path
+
+from .cache import DigestCache, StatCache
+from .formats import DigestRecord
+from .hash import HashDigest, dot_path
+from .walk import walk_files
+
+
+def iter_digests(
+    base=".",
+    paths=None,
+    hash=None,
+    jobs=1,
+    executor=None,
+    block_size=None,
+    io=None,
+    sort=True,
+    cache=None,
+    links=True,
+):
+    """yield a DigestRecord for each regular file below base, or for each of paths
+
+    Records hold the './'-prefixed path, size, mtime_ns and a raw digest per
+    hash; hash may name one hash or list several. Without paths, base is
+    walked in-process, in listing order unless sort is false. paths may be
+    relative to base or absolute paths below it, and are hashed in the order
+    given. Nothing is written to disk and no processes are started, except
+    for a process executor's workers; with cache, digests of unchanged files
+    are reused from that database.
+    """
+
+    base = Path(base)
+    hasher = HashDigest(base, hash, block_size, io)
+
+    if paths is None:
+        files = walk_files(base, sort)
+    else:
+        files = ((_relative(base, path), None) for path in paths)
+
+    with DigestCache(cache, base) if cache else nullcontext(StatCache(base)) as digest_cache:
+        for filename, stat, digests in digest_cache.file_digests(hasher, files, jobs, executor, links=links):
+            yield DigestRecord(
+                dot_path(filename), stat.st_size, stat.st_mtime_ns, tuple(bytes.fromhex(digest) for digest in digests)
+            )
+
+
+def _relative(base, path):
+    path = Path(path)
+    if path.is_absolute():
+        return str(path.relative_to(base.absolute()))
+    return str(path)
@@ -0,0 +1,179 @@
+"""hashtree throughput benchmark"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import click
+
+from .aio import DEFAULT_ENGINE, ENGINES
+from .cli import hashtree
+from .hash import HASHES, IO_MODES
+from .pool import EXECUTORS
+from .progress import ProgressReader
+from .version import __version__
+
+# name: (file count, file size)
+SHAPES = {
+    "tiny": (20000, 512),
+    "small": (2000, 64 * 1024),
+    "large": (4, 64 * 1024 * 1024),
+}
+
+DEFAULT_SHAPES = ["tiny", "large"]
+
+FILES_PER_DIR = 1000
+
+
+def parse_shape(shape):
+    """return (count, size) for a shape name or a 'COUNTxSIZE' spec"""
+    if shape in SHAPES:
+        return SHAPES[shape]
+    count, sep, size = shape.partition("x")
+    if not (sep and count.isdigit() and size.isdigit()):
+        raise click.BadParameter(f"expected one of {list(SHAPES)} or COUNTxSIZE: {shape}")
+    return int(count), int(size)
+
+
+def make_tree(root, count, size, seed=0):
+    """write count files of size pseudo-random bytes below root, FILES_PER_DIR per directory"""
+    rng = random.Random(seed)
+    block = 1024 * 1024
+    for index in range(count):
+        path = Path(root, f"d{index // FILES_PER_DIR:04d}", f"f{index:06d}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as ofp:
+            for offset in range(0, size, block):
+                ofp.write(rng.randbytes(min(block, size - offset)))
+
+
+def peak_rss():
+    """return peak resident set size of this process and its children in bytes"""
+    usage = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def run_case(root, options):
+    """hash the tree once with options, returning (seconds, peak rss); run in a fresh process"""
+    start = time.perf_counter()
+    hashtree(root, None, os.devnull, **options)
+    return time.perf_counter() - start, peak_rss()
+
+
+def bench_case(root, options, repeat):
+    best = None
+    for _ in range(repeat):
+        # a fresh spawned process per run keeps peak rss specific to the case
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(run_case, root, options).result()
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def make_file_list(path, count, separator):
+    with Path(path).open("w") as ofp:
+        for index in range(count):
+            ofp.write(f"./d{index // FILES_PER_DIR:04d}/f{index:06d}{separator}")
+
+
+def bench_reader(path, separator, progress):
+    """return lines per second read from a file list by ProgressReader"""
+    with Path(path).open("r") as ifp, open(os.devnull, "w") as devnull:
+        start = time.perf_counter()
+        with ProgressReader(ifp, separator, disable=not progress, file=devnull) as reader:
+            count = sum(1 for _ in reader.readlines())
+        return count / (time.perf_counter() - start)
+
+
+def warm(root):
+    """read every file once so runs start from the same page cache state"""
+    for path in Path(root).rglob("*"):
+        if path.is_file():
+            with path.open("rb") as ifp:
+                while ifp.read(1024 * 1024):
+                    pass
+
+
+@click.command("hashtree-bench", context_settings={"show_default": True})
+@click.option("-s", "--shape", multiple=True, default=DEFAULT_SHAPES, help=f"tree shape: {list(SHAPES)} or COUNTxSIZE")
+@click.option("-h", "--hash", "hashes", multiple=True, type=click.Choice(HASHES), help="hashes (default: all)")
+@click.option("-i", "--io", "io_modes", multiple=True, type=click.Choice(IO_MODES), help="io modes (default: all)")
+@click.option(
+    "-j", "--jobs", multiple=True, type=click.IntRange(min=0), default=[1, 0], help="job counts (0: one per cpu)"
+)
+@click.option("-x", "--executor", "executors", multiple=True, type=click.Choice(list(EXECUTORS)), default=["thread"])
+@click.option("-E", "--engine", "engines", multiple=True, type=click.Choice(ENGINES), default=[DEFAULT_ENGINE])
+@click.option(
+    "-l", "--list-lines", type=click.IntRange(min=0), default=0, help="also time reading a file list of this many lines"
+)
+@click.option("-r", "--repeat", type=click.IntRange(min=1), default=1, help="runs per case; the fastest is reported")
+@click.option("-d", "--dir", "workdir", type=click.Path(file_okay=False), help="create trees below this directory")
+@click.option("-o", "--output", type=click.Path(dir_okay=False, writable=True), help="write JSON results to file")
+def bench(shape, hashes, io_modes, jobs, executors, engines, list_lines, repeat, workdir, output):
+    """measure hashing throughput across algorithms, tree shapes and io/parallel modes"""
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir, prefix="hashtree-bench-") as tmpdir:
+        for name in shape:
+            count, size = parse_shape(name)
+            root = Path(tmpdir, name)
+            make_tree(root, count, size)
+            warm(root)
+            for hash, io, job_count, executor, engine in itertools.product(
+                hashes or HASHES, io_modes or IO_MODES, jobs, executors, engines
+            ):
+                options = dict(hash=hash, io=io, jobs=job_count, executor=executor, engine=engine)
+                seconds, rss = bench_case(root, options, repeat)
+                result = dict(
+                    shape=name,
+                    files=count,
+                    bytes=count * size,
+                    **options,
+                    seconds=round(seconds, 6),
+                    mb_per_s=round(count * size / seconds / 1e6, 3),
+                    files_per_s=round(count / seconds, 3),
+                    peak_rss=rss,
+                )
+                results.append(result)
+                click.echo(
+                    f"{name:>8} {hash:>10} {io:>5} j={job_count:<3} {executor:>7} {engine:>7}"
+                    f" {result['mb_per_s']:>10.1f} MB/s {result['files_per_s']:>10.1f} files/s"
+                    f" {rss / 2**20:>8.1f} MiB",
+                    err=True,
+                )
+
+        readers = []
+        for separator, progress in itertools.product(["\n", "\0"], [False, True]) if list_lines else []:
+            path = Path(tmpdir, "files")
+            make_file_list(path, list_lines, separator)
+            lines_per_s = max(bench_reader(path, separator, progress) for _ in range(repeat))
+            name = "nul" if separator == "\0" else "newline"
+            readers.append(dict(separator=name, progress=progress, lines=list_lines, lines_per_s=round(lines_per_s, 3)))
+            click.echo(f"{'list':>8} {name:>10} progress={progress!s:<5} {lines_per_s:>12.1f} lines/s", err=True)
+
+    report = dict(
+        version=__version__,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        results=results,
+        readers=readers,
+    )
+    if output:
+        Path(output).write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        click.echo(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(bench())  # pragma: no cover
@@ -0,0 +1,443 @@
+"""reuse of previously computed digests for unchanged files"""
+
+import os
+import sqlite3
+import time
+from collections import deque
+from pathlib import Path
+
+from .aio import async_ordered_map
+from .check import parse_digest_line
+from .hash import dot_path, format_digest_line
+from .pool import ordered_map
+from .sort import sort_key
+
+# rows written between commits
+COMMIT_INTERVAL = 10000
+
+# seconds between fsyncs of a journal
+JOURNAL_SYNC_INTERVAL = 5.0
+
+# bytes read at a time when searching back for a journal's last complete line
+JOURNAL_READ_CHUNK = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (path, hash)
+);
+CREATE TABLE IF NOT EXISTS generation (value INTEGER NOT NULL);
+"""
+
+
+class _HardLinks:
+    """the digests of each inode with several hard links, kept until its last link is seen"""
+
+    def __init__(self):
+        # (st_dev, st_ino): [digests once known, links not yet seen]
+        self.inodes = {}
+
+    def see(self, stat):
+        """return (inode, linked) for a file: inode is None unless it has several links, linked if seen before"""
+        if stat is None or stat.st_nlink < 2:
+            return None, False
+        inode = (stat.st_dev, stat.st_ino)
+        if inode in self.inodes:
+            return inode, True
+        self.inodes[inode] = [None, stat.st_nlink - 1]
+        return inode, False
+
+    def digests(self, inode, linked, digests):
+        """return the digests for a path seen as (inode, linked): its own, or those of the inode's first path"""
+        if inode is None:
+            return digests
+        link = self.inodes[inode]
+        if not linked:
+            link[0] = digests
+            return digests
+        link[1] -= 1
+        if not link[1]:
+            del self.inodes[inode]
+        return link[0]
+
+
+class StatCache:
+    """cache that stats each file but never holds a digest
+
+    Subclasses override lookup() and store(); file_digests() drives them.
+    """
+
+    def __init__(self, base_path=None):
+        self.base_path = Path(base_path or ".")
+        self.hits = 0
+        self.misses = 0
+        # files whose contents were read; misses less the hard links that reuse another path's digests
+        self.hashed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def key(self, filename):
+        return dot_path(filename)
+
+    def stat(self, filename, entry=None):
+        """return stat of filename, or None if it does not exist
+
+        entry is the file's DirEntry when it came from the walker
+        """
+        try:
+            if entry is None:
+                return os.stat(self.base_path / filename)
+            return entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            return None
+
+    def lookup(self, filename, hashes, entry=None):
+        """return (key, stat, digests); digests, one per hash, is None unless all are cached and valid"""
+        self.misses += 1
+        return self.key(filename), self.stat(filename, entry), None
+
+    def store(self, key, hashes, stat, digests):
+        pass
+
+    def _reuse(self, key, stat, hashes, digests=None, metadata=None):
+        """return lookup's result, reusing digests, {HASH: digest}, if it holds every hash and metadata matches stat"""
+        if stat is not None and digests is not None and metadata == (stat.st_size, stat.st_mtime_ns):
+            if all(hash in digests for hash in hashes):
+                self.hits += 1
+                return key, stat, tuple(digests[hash] for hash in hashes)
+        self.misses += 1
+        return key, stat, None
+
+    def file_digests(self, hasher, files, jobs=1, executor=None, engine=None, concurrency=None, links=False):
+        """yield (filename, stat, digests) for (filename, DirEntry) pairs, hashing only files not cached
+
+        With links, a file with several hard links is hashed once; the other
+        paths to its inode reuse the digests.
+        """
+        entries = deque()
+        inodes = _HardLinks()
+
+        def lookups():
+            for filename, entry in files:
+                key, stat, digests = self.lookup(filename, hasher.hashes, entry)
+                inode, linked = inodes.see(stat) if links else (None, False)
+                entries.append((filename, key, stat, digests, inode, linked))
+                # results come back in order, so the first path's digests are known before this one's
+                yield filename, () if linked else digests
+
+        if engine == "asyncio":
+            results = async_ordered_map(hasher, lookups(), jobs, concurrency)
+        else:
+            results = ordered_map(hasher.cached_digest, lookups(), jobs, executor)
+
+        for digests in results:
+            filename, key, stat, cached, inode, linked = entries.popleft()
+            digests = inodes.digests(inode, linked, digests)
+            if cached is None and not linked:
+                self.hashed += 1
+            if cached is None and stat is not None:
+                self.store(key, hasher.hashes, stat, digests)
+            yield filename, stat, digests
+
+
+class NoCache(StatCache):
+    """cache that neither stats files nor holds digests"""
+
+    def stat(self, filename, entry=None):
+        return None
+
+
+class DigestCache(StatCache):
+    """sqlite database of previously computed digests
+
+    A cached digest is reused when the file's size, mtime_ns and inode are
+    unchanged. Each run is a new generation; entries used or written are
+    stamped with it, and prune() removes entries not seen in this run whose
+    files no longer exist.
+    """
+
+    def __init__(self, path, base_path=None):
+        super().__init__(base_path)
+        self.path = Path(path)
+        self.db = None
+        self.pending = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.prune()
+        self.close()
+        return False
+
+    def open(self):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        (generation,) = self.db.execute("SELECT max(value) FROM generation").fetchone()
+        self.generation = (generation or 0) + 1
+        self.db.execute("DELETE FROM generation")
+        self.db.execute("INSERT INTO generation VALUES (?)", (self.generation,))
+        self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def key(self, filename):
+        return os.path.abspath(self.base_path / filename)
+
+    def lookup(self, filename, hashes, entry=None):
+        key = self.key(filename)
+        stat = self.stat(filename, entry)
+        if stat is None:
+            return key, None, None
+        current = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        rows = self.db.execute("SELECT hash, size, mtime_ns, inode, digest FROM digests WHERE path=?", (key,))
+        cached = {row[0]: row[4] for row in rows if tuple(row[1:4]) == current}
+        if all(hash in cached for hash in hashes):
+            self.hits += 1
+            self._write("UPDATE digests SET generation=? WHERE path=?", (self.generation, key))
+            return key, stat, tuple(cached[hash] for hash in hashes)
+        self.misses += 1
+        return key, stat, None
+
+    def store(self, key, hashes, stat, digests):
+        for hash, digest in zip(hashes, digests):
+            self._write(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, hash, stat.st_size, stat.st_mtime_ns, stat.st_ino, digest, self.generation),
+            )
+
+    def _write(self, sql, args):
+        self.db.execute(sql, args)
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.db.commit()
+            self.pending = 0
+
+    def prune(self):
+        """delete entries not seen in this run for files that no longer exist"""
+        stale = self.db.execute("SELECT DISTINCT path FROM digests WHERE generation < ?", (self.generation,))
+        missing = [(path,) for (path,) in stale.fetchall() if not os.path.exists(path)]
+        self.db.executemany("DELETE FROM digests WHERE path=?", missing)
+        self.db.commit()
+        return len(missing)
+
+
+def sidecar_path(filename):
+    """return the name of the stat sidecar written alongside a digest listing"""
+    return Path(str(filename) + ".stat")
+
+
+def format_sidecar_line(filename, stat):
+    return f"{stat.st_size} {stat.st_mtime_ns} {dot_path(filename)}"
+
+
+def parse_sidecar_line(line):
+    """return (path, (size, mtime_ns)) from a stat sidecar line, or None if it is not one"""
+    fields = line.rstrip("\n").split(" ", 2)
+    if len(fields) != 3 or not (fields[0].isdigit() and fields[1].isdigit()):
+        return None
+    return fields[2], (int(fields[0]), int(fields[1]))
+
+
+def group_digests(entries):
+    """yield (path, ({HASH: digest}, metadata)) for each run of adjacent (path, metadata, hash, digest) entries
+
+    Lines for each hash of a file are written together, so each run holds
+    all of a file's digests; metadata is that of the run's last entry.
+    """
+    path, digests, metadata = None, {}, None
+    for entry_path, entry_metadata, hash, digest in entries:
+        if entry_path != path:
+            if digests:
+                yield path, (digests, metadata)
+            path, digests = entry_path, {}
+        digests[hash.upper()] = digest
+        metadata = entry_metadata
+    if digests:
+        yield path, (digests, metadata)
+
+
+class SortedLookup:
+    """look up values from an iterable of (path, value) pairs sorted by sort_key
+
+    Lookups that arrive in the same order only read ahead as far as needed;
+    entries passed over are stashed, so out-of-order lookups still succeed
+    as long as the entry has been read.
+    """
+
+    def __init__(self, items):
+        self.items = iter(items)
+        self.stash = {}
+
+    def get(self, path):
+        if path in self.stash:
+            return self.stash.pop(path)
+        key = sort_key(path)
+        for item_path, value in self.items:
+            if item_path == path:
+                return value
+            self.stash[item_path] = value
+            if sort_key(item_path) > key:
+                break
+        return None
+
+
+class ListingCache(StatCache):
+    """digests from a previous run's output
+
+    A digest is reused when the file's size and mtime_ns match the stat
+    sidecar written with the listing. Files missing from either one are
+    hashed. Both are read sequentially alongside the sorted file list; the
+    lines for each hash of a file are expected to be adjacent, as they are
+    written.
+    """
+
+    def __init__(self, listing, base_path=None):
+        super().__init__(base_path)
+        self.listing = Path(listing)
+        self.sidecar = sidecar_path(listing)
+        self.opened = []
+
+    def __enter__(self):
+        listing = self.listing.open("r")
+        self.opened.append(listing)
+        parsed = filter(None, map(parse_digest_line, listing))
+        self.digests = SortedLookup(group_digests((path, None, hash, digest) for hash, path, digest in parsed))
+        if self.sidecar.is_file():
+            sidecar = self.sidecar.open("r")
+            self.opened.append(sidecar)
+            self.stats = SortedLookup(filter(None, map(parse_sidecar_line, sidecar)))
+        else:
+            self.stats = SortedLookup([])
+        return self
+
+    def __exit__(self, *args):
+        for stream in self.opened:
+            stream.close()
+        self.opened = []
+        return False
+
+    def lookup(self, filename, hashes, entry=None):
+        key = self.key(filename)
+        stat = self.stat(filename, entry)
+        if stat is None:
+            return self._reuse(key, stat, hashes)
+        digests, _ = self.digests.get(key) or (None, None)
+        return self._reuse(key, stat, hashes, digests, self.stats.get(key))
+
+
+def format_journal_line(hash, filename, stat, digest):
+    return f"{stat.st_size} {stat.st_mtime_ns} {format_digest_line(hash, filename, digest)}"
+
+
+def parse_journal_line(line):
+    """return (path, (size, mtime_ns), hash, digest) from a journal line, or None if it is not one
+
+    A journal line is a stat sidecar line whose path is a digest line.
+    """
+    prefixed = parse_sidecar_line(line)
+    parsed = prefixed and parse_digest_line(prefixed[0])
+    if not parsed:
+        return None
+    hash, path, digest = parsed
+    return path, prefixed[1], hash.upper(), digest
+
+
+def _complete_size(path):
+    """return the length of a file up to and including its last newline"""
+    with Path(path).open("rb") as ifp:
+        end = ifp.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - JOURNAL_READ_CHUNK)
+            ifp.seek(start)
+            newline = ifp.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def _read_prefix(path, size):
+    """yield the lines in the first size bytes of a file"""
+    with Path(path).open("rb") as ifp:
+        for line in ifp:
+            size -= len(line)
+            if size < 0:
+                return
+            yield line.decode("utf-8", "surrogateescape")
+
+
+class JournalCache(StatCache):
+    """append each new result to a journal, and with resume reuse the results it already holds
+
+    Journal lines are 'size mtime_ns HASH (./path) = hex', appended in
+    output order and fsynced every JOURNAL_SYNC_INTERVAL seconds. A resumed
+    run reads the journal as it was when the run started alongside the file
+    list, which comes in the same order, reusing a journaled digest when the
+    file's size and mtime_ns still match; only the files it hashes are
+    appended.
+    """
+
+    def __init__(self, journal, base_path=None, resume=False):
+        super().__init__(base_path)
+        self.journal = Path(journal)
+        self.resume = resume
+        self.ofp = None
+
+    def __enter__(self):
+        if self.resume and self.journal.is_file():
+            # drop a line torn by the interruption, so new lines are not appended to it
+            size = _complete_size(self.journal)
+            os.truncate(self.journal, size)
+            lines = _read_prefix(self.journal, size)
+            self.journaled = SortedLookup(group_digests(filter(None, map(parse_journal_line, lines))))
+            self.ofp = self.journal.open("a")
+        else:
+            self.journaled = SortedLookup([])
+            self.ofp = self.journal.open("w")
+        self.synced = time.monotonic()
+        return self
+
+    def __exit__(self, *args):
+        if self.ofp is not None:
+            self.sync()
+            self.ofp.close()
+            self.ofp = None
+        return False
+
+    def lookup(self, filename, hashes, entry=None):
+        key = self.key(filename)
+        stat = self.stat(filename, entry)
+        if stat is None:
+            return self._reuse(key, stat, hashes)
+        digests, metadata = self.journaled.get(key) or (None, None)
+        return self._reuse(key, stat, hashes, digests, metadata)
+
+    def store(self, key, hashes, stat, digests):
+        for hash, digest in zip(hashes, digests):
+            self.ofp.write(format_journal_line(hash, key, stat, digest) + "\n")
+        if time.monotonic() - self.synced >= JOURNAL_SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        self.ofp.flush()
+        os.fsync(self.ofp.fileno())
+        self.synced = time.monotonic()
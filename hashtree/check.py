@@ -0,0 +1,91 @@
+"""verify files against a BSD-style digest listing"""
+
+import re
+from collections import Counter
+
+from .hash import HASHES, HashDigest
+from .pool import ordered_map
+
+DIGEST_LINE = re.compile(r"^(?P<hash>\w+) \((?P<path>.*)\) = (?P<digest>[0-9a-fA-F]+)$")
+
+OK = "OK"
+FAILED = "FAILED"
+MISSING = "MISSING"
+UNREADABLE = "FAILED open or read"
+MALFORMED = "MALFORMED"
+
+
+def parse_digest_line(line):
+    """return (hash, path, digest) from a 'HASH (./path) = hex' line, or None if it is not one"""
+    match = DIGEST_LINE.match(line.rstrip("\n"))
+    if match is None or match["hash"].lower() not in HASHES:
+        return None
+    return match["hash"].lower(), match["path"], match["digest"].lower()
+
+
+class DigestChecker:
+    """rehash a parsed digest line, returning (path, status)"""
+
+    def __init__(self, base_path=None, block_size=None, io=None):
+        self.base_path = base_path
+        self.block_size = block_size
+        self.io = io
+        self.hashers = {}
+
+    def __call__(self, entry):
+        hash, path, expected = entry
+        hasher = self.hashers.get(hash)
+        if hasher is None:
+            hasher = self.hashers[hash] = HashDigest(self.base_path, hash, self.block_size, self.io)
+        try:
+            digest = hasher.digest(path)
+        except FileNotFoundError:
+            return path, MISSING
+        except OSError:
+            # a directory, a permission denied or an I/O error; reported, and the check goes on
+            return path, UNREADABLE
+        return path, OK if digest == expected else FAILED
+
+
+def check_digests(lines, ofp, base_path=None, block_size=None, jobs=1, executor=None, fail_fast=False, io=None):
+    """write 'path: STATUS' for each digest line in input order, returning a Counter of statuses
+
+    With fail_fast, checking stops at the first file that is not OK.
+    """
+
+    counts = Counter()
+
+    def entries():
+        for line in lines:
+            entry = parse_digest_line(line)
+            if entry is not None:
+                yield entry
+            elif line.strip():
+                counts[MALFORMED] += 1
+
+    results = ordered_map(DigestChecker(base_path, block_size, io), entries(), jobs, executor)
+    try:
+        for path, status in results:
+            counts[status] += 1
+            ofp.write(f"{path}: {status}\n")
+            if fail_fast and status != OK:
+                break
+    finally:
+        results.close()
+    return counts
+
+
+def check_failed(counts):
+    return bool(counts[FAILED] or counts[MISSING] or counts[UNREADABLE])
+
+
+def check_warnings(counts):
+    """return sha256sum-style warnings summarizing a check"""
+    warnings = []
+    if counts[MALFORMED]:
+        warnings.append(f"{counts[MALFORMED]} line(s) improperly formatted")
+    if counts[MISSING] or counts[UNREADABLE]:
+        warnings.append(f"{counts[MISSING] + counts[UNREADABLE]} listed file(s) could not be read")
+    if counts[FAILED]:
+        warnings.append(f"{counts[FAILED]} computed checksum(s) did NOT match")
+    return warnings
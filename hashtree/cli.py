@@ -1,22 +1,61 @@
 """hashtree command"""
 
 import atexit
+import inspect
+import os
 import shlex
 import shutil
 import subprocess
 import sys
+from contextlib import ExitStack, contextmanager, nullcontext
+from functools import partial
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 import click
 import click.core
-
-from .clio import CLIO
+from tqdm import tqdm
+
+from .aio import DEFAULT_CONCURRENCY, DEFAULT_ENGINE, ENGINES
+from .cache import (
+    DigestCache,
+    JournalCache,
+    ListingCache,
+    NoCache,
+    StatCache,
+    format_sidecar_line,
+    sidecar_path,
+)
+from .check import check_digests, check_failed, check_warnings
+from .clio import CLIO, iter_lines, list_newline
+from .dupes import find_duplicates
 from .exception_handler import ExceptionHandler
-from .hash import DEFAULT_HASH, HASHES, HashDigest
-from .progress import ProgressReader
+from .formats import DEFAULT_FORMAT, FORMATS, WRITERS, SortedBSDWriter
+from .hash import (
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_HASH,
+    DEFAULT_IO,
+    HASHES,
+    IO_MODES,
+    HashDigest,
+)
+from .pool import DEFAULT_EXECUTOR, EXECUTORS, prefetch
+from .progress import (
+    BYTE_PROGRESS,
+    DEFAULT_PROGRESS_UNIT,
+    PROGRESS_UNITS,
+    BatchedProgress,
+    ProgressReader,
+    background_total,
+)
+from .shard import merge_listings, parse_shard, select_shard
 from .shell import _shell_completion
+from .sort import DEFAULT_SORT_ARGS, DEFAULT_SORT_MEMORY, sort_lines
+from .stats import RunStats, TimedHashDigest, stage, timed
+from .tree import MerkleTree
 from .version import __timestamp__, __version__
+from .walk import walk_files
+from .watch import replace_listing, watch_tree
 
 header = f"{__name__.split('.')[0]} v{__version__} {__timestamp__}"
 
@@ -28,8 +67,6 @@ def _ehandler(ctx, option, debug):
 
 HASH_CHOICES = list(HASHES)
 
-DEFAULT_SORT_ARGS = "-ifdk1.1"
-
 
 @click.command("hashtree", context_settings={"auto_envvar_prefix": "HASHTREE", "show_default": True})
 @click.version_option(message=header)
@@ -52,18 +89,183 @@ DEFAULT_SORT_ARGS = "-ifdk1.1"
     "-h",
     "--hash",
     type=click.Choice(HASH_CHOICES),
-    default=DEFAULT_HASH,
-    help="select checksum hash",
+    multiple=True,
+    default=[DEFAULT_HASH],
+    help="select checksum hash; repeat to compute several in one pass",
+)
+@click.option(
+    "-B",
+    "--block-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_BLOCK_SIZE,
+    help="file read block size in bytes",
+)
+@click.option(
+    "-i",
+    "--io",
+    type=click.Choice(IO_MODES),
+    default=DEFAULT_IO,
+    help="read files with buffered reads, mmap, mmap for large files only, or skipping the holes of sparse files",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=0),
+    default=1,
+    help="number of files hashed concurrently (0 for one per cpu)",
+)
+@click.option(
+    "-x",
+    "--executor",
+    type=click.Choice(list(EXECUTORS)),
+    default=DEFAULT_EXECUTOR,
+    help="worker pool used when jobs > 1",
+)
+@click.option(
+    "-E",
+    "--engine",
+    type=click.Choice(ENGINES),
+    default=DEFAULT_ENGINE,
+    help="hash with a worker pool, or with many opens and reads in flight for high-latency filesystems",
+)
+@click.option(
+    "-n",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    help="files opened and read concurrently by the asyncio engine",
+)
+@click.option(
+    "-c",
+    "--cache",
+    type=click.Path(dir_okay=False, writable=True),
+    help="reuse digests of unchanged files from this cache database",
+)
+@click.option(
+    "-u",
+    "--update",
+    type=click.Path(dir_okay=False, readable=True, exists=True),
+    help="reuse digests of unchanged files from a previous output listing",
+)
+@click.option(
+    "-J",
+    "--journal",
+    type=click.Path(dir_okay=False, writable=True),
+    help="append each result to this journal as it is written, for --resume after an interruption",
+)
+@click.option(
+    "-R",
+    "--resume",
+    is_flag=True,
+    help="reuse the digests of unchanged files already in the journal",
+)
+@click.option(
+    "-m",
+    "--metadata",
+    is_flag=True,
+    help="write file sizes and mtimes to OUTFILE.stat for a later --update",
+)
+@click.option(
+    "-M",
+    "--tree",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write Merkle digests of each directory and the root to this file, using the first hash",
+)
+@click.option(
+    "-t/-T",
+    "--stream/--no-stream",
+    is_flag=True,
+    default=False,
+    help="list files in a separate thread, overlapping the walk with hashing",
+)
+@click.option(
+    "-C",
+    "--check",
+    type=click.Path(dir_okay=False, readable=True),
+    help="verify files against the digests listed in this file",
+)
+@click.option("-e", "--fail-fast", is_flag=True, help="stop checking at the first failed or missing file")
+@click.option(
+    "-r",
+    "--format",
+    type=click.Choice(FORMATS),
+    default=DEFAULT_FORMAT,
+    help="output format: BSD or GNU checksum lines, JSON lines with size and mtime, or binary records",
+)
+@click.option(
+    "-L/-l",
+    "--links/--no-links",
+    is_flag=True,
+    default=True,
+    help="hash each hard-linked file once, reusing its digests for the other paths; needs a stat per file",
+)
+@click.option(
+    "-g",
+    "--duplicates",
+    is_flag=True,
+    help="list groups of files with identical contents, separated by blank lines, instead of every digest",
+)
+@click.option(
+    "-N",
+    "--shard",
+    metavar="K/N",
+    help="hash only the files in shard K of N, partitioned by a hash of each path",
+)
+@click.option(
+    "-Y",
+    "--merge",
+    type=click.Path(dir_okay=False, readable=True, exists=True),
+    multiple=True,
+    help="merge the sorted listings of every shard into OUTFILE instead of hashing; may be repeated",
+)
+@click.option(
+    "-W",
+    "--watch",
+    type=click.FloatRange(min=0, min_open=True),
+    help="after hashing, watch the tree and rewrite OUTFILE at most every WATCH seconds as files change",
+)
+@click.option(
+    "--stats",
+    is_flag=False,
+    flag_value="-",
+    metavar="[FILE]",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write a JSON report of stage timings and file statistics to FILE, or to stderr, when done",
 )
 @click.option("-p/-P", "--progress/--no-progress", is_flag=True, help="show/hide progress bar")
+@click.option(
+    "-U",
+    "--progress-unit",
+    type=click.Choice(PROGRESS_UNITS),
+    default=DEFAULT_PROGRESS_UNIT,
+    help="progress in files hashed, or in bytes hashed out of the total size of all files",
+)
 @click.option("-a", "--ascii", is_flag=True, help="ASCII progress bar")
 @click.option("-w", "--width", type=int, help="progress bar width")
-@click.option("-f/-F", "--find/--no-find", is_flag=True, default=True, help="generate file list with 'find'")
+@click.option("-f/-F", "--find/--no-find", is_flag=True, default=True, help="generate file list by walking base dir")
+@click.option(
+    "-0", "--null", is_flag=True, help="file list names end with NUL rather than newline, as from 'find -print0'"
+)
 @click.option(
     "-s/-S", "--sort-files/--no-sort-files", is_flag=True, default=True, help="sort input/generated file list"
 )
-@click.option("-o/-O", "--sort-output/--no-sort-output", is_flag=True, default=False, help="sort output with 'sort'")
-@click.option("-k", "--sort-args", default=DEFAULT_SORT_ARGS, help="args passed to sort")
+@click.option("-o/-O", "--sort-output/--no-sort-output", is_flag=True, default=False, help="sort output")
+@click.option(
+    "-k", "--sort-args", default=DEFAULT_SORT_ARGS, help="sort order; other than the default, args passed to 'sort'"
+)
+@click.option(
+    "-K",
+    "--sort-memory",
+    type=click.IntRange(min=1),
+    default=DEFAULT_SORT_MEMORY,
+    help="bytes of lines sorted in memory before spilling to temp files",
+)
+@click.option(
+    "-D",
+    "--temp-dir",
+    type=click.Path(file_okay=False, writable=True, exists=True),
+    help="directory for temp files  [default: system temp dir]",
+)
 @click.option(
     "-b",
     "--base-dir",
@@ -74,37 +276,45 @@ DEFAULT_SORT_ARGS = "-ifdk1.1"
 @click.argument("INFILE", type=click.Path(dir_okay=False), default="-")
 @click.argument("OUTFILE", type=click.Path(dir_okay=False, writable=True), default="-")
 @click.pass_context
-def cli(
-    ctx,
-    debug,
-    shell_completion,
-    base_dir,
-    ascii,
-    find,
-    hash,
-    sort_files,
-    sort_output,
-    sort_args,
-    progress,
-    width,
-    infile,
-    outfile,
-):
-    """generate hash digest for list of files"""
-
-    return hashtree(
-        base_dir,
-        infile,
-        outfile,
-        ascii=ascii,
-        find=find,
-        hash=hash,
-        sort_files=sort_files,
-        sort_output=sort_output,
-        sort_args=sort_args,
-        progress=progress,
-        width=width
-    )
+def cli(ctx, debug, shell_completion, **options):
+    """generate hash digest for list of files
+
+    \b
+    --check, --watch and --merge read no file list; given one argument,
+    it is OUTFILE, e.g. 'hashtree --watch 5 listing'.
+    """
+
+    mode = select_mode(options)
+    parameters = inspect.signature(mode).parameters
+    if "infile" not in parameters and ctx.get_parameter_source("outfile") is not click.core.ParameterSource.COMMANDLINE:
+        # a lone positional is the mode's OUTFILE
+        options["infile"], options["outfile"] = "-", options["infile"]
+
+    unused = [param for param in ctx.command.params if _unused_option(ctx, parameters, param, options)]
+    if unused:
+        names = ", ".join(param.opts[-1] if isinstance(param, click.Option) else param.name.upper() for param in unused)
+        selected = [f"with --{name}" for name, function in MODES.items() if function is mode]
+        context = selected[0] if selected else "when hashing"
+        raise click.UsageError(f"{names} cannot be used {context}", ctx)
+
+    ctx.exit(mode(**{name: value for name, value in options.items() if name in parameters}))
+
+
+def select_mode(options):
+    """return the function for the mode the options select: one of MODES, or hashtree"""
+    selected = [name for name in MODES if options.get(name)]
+    if len(selected) > 1:
+        raise click.UsageError(" and ".join(f"--{name}" for name in selected) + " are mutually exclusive")
+    return MODES[selected[0]] if selected else hashtree
+
+
+def _unused_option(ctx, parameters, param, options):
+    """return True if param was given on the command line with a value the mode's parameters do not take"""
+    if param.name not in options or param.name in MODES or param.name in parameters:
+        return False
+    if ctx.get_parameter_source(param.name) is not click.core.ParameterSource.COMMANDLINE:
+        return False
+    return options[param.name] != param.default
 
 
 def hashtree(
@@ -114,34 +324,220 @@ def hashtree(
     *,
     ascii=False,
     find=True,
+    null=False,
     hash=None,
+    block_size=None,
+    io=None,
+    jobs=1,
+    executor=None,
+    engine=None,
+    concurrency=None,
+    cache=None,
+    update=None,
+    journal=None,
+    resume=False,
+    metadata=False,
+    tree=None,
+    stream=False,
+    format=None,
+    links=True,
+    shard=None,
+    stats=None,
     sort_files=True,
     sort_output=False,
     sort_args=None,
+    sort_memory=None,
+    temp_dir=None,
+    progress=False,
+    progress_unit=None,
+    width=None,
+):
+    """write digests of the files below base_dir, or listed in infile, to outfile; return 0
+
+    Like the other modes, raises RuntimeError for options that cannot be
+    combined and returns the exit status.
+    """
+    base = Path(base_dir)
+    sort_args = sort_args or DEFAULT_SORT_ARGS
+    format = format or DEFAULT_FORMAT
+    separator = "\0" if null else "\n"
+    shard = None if shard is None else parse_shard(shard)
+    run_stats = RunStats() if stats else None
+
+    # timed results carry each file's hashing time back from worker processes
+    hasher = (TimedHashDigest if run_stats else HashDigest)(base, hash, block_size, io)
+    check_options(outfile, hasher, format, cache, update, journal, resume, metadata, tree, shard, sort_output)
+    check_engine(hasher, engine, executor)
+
+    files, infile = list_files(
+        base, infile, find, separator, sort_files, sort_args, sort_memory, temp_dir, shard, run_stats
+    )
+    # sizes are totalled from a second walk in the background, so the first one stays lazy
+    total_files = total_walk(base, shard) if files is not None and progress_unit == "bytes" else None
+
+    # the stat sidecar is kept with the final output; an update writes a new one
+    sidecar = sidecar_path(outfile) if (metadata or update) and not is_stdio(outfile) else None
+
+    # a sorted walk hashed once per file is produced in output order; otherwise the output is sorted when done
+    presorted = sort_output and files is not None and sort_files and len(hasher.hashes) == 1
+
+    listing = outfile
+    if sort_output and not presorted:
+        outfile = create_tempfile(temp_dir)
+    elif update and not is_stdio(outfile) and Path(outfile).exists() and Path(outfile).samefile(update):
+        # updating a listing in place: write the new one beside it and replace it when done
+        outfile = create_tempfile(Path(outfile).parent)
+
+    merkle_tree = MerkleTree(hasher.hash) if tree else None
+
+    # the sidecar replaces the old one only once the listing it describes is in place
+    with replacing_output(sidecar) as sidecar_ofp:
+        with open_cache(base, cache, update, journal, resume, sidecar) as digest_cache:
+            generate_hash_digests(
+                base,
+                infile,
+                outfile,
+                hasher,
+                progress_options(listing, progress, ascii, width),
+                jobs=jobs,
+                executor=executor,
+                engine=engine,
+                concurrency=concurrency,
+                cache=digest_cache,
+                files=files,
+                total_files=total_files,
+                stream=stream,
+                sidecar_ofp=sidecar_ofp,
+                tree=merkle_tree,
+                ordered=presorted,
+                progress_unit=progress_unit,
+                separator=separator,
+                format=format,
+                links=links,
+                stats=run_stats,
+            )
+
+        if merkle_tree:
+            with CLIO(None, tree) as clio:
+                for line in merkle_tree.lines():
+                    clio.ofp.write(line + "\n")
+
+        if outfile != listing:
+            place_listing(outfile, listing, sort_output and not presorted, sort_args, sort_memory, temp_dir, run_stats)
+
+    if run_stats:
+        run_stats.write(stats)
+    return 0
+
+
+def check_tree(
+    base_dir,
+    outfile,
+    *,
+    check,
+    ascii=False,
+    block_size=None,
+    io=None,
+    jobs=1,
+    executor=None,
+    fail_fast=False,
     progress=False,
     width=None,
 ):
+    """write 'path: STATUS' to outfile for each line of the digest listing check; return 1 if any file failed
+
+    Warnings summarizing the check are written to stderr, as sha256sum does.
+    """
+    with CLIO(check, outfile) as clio:
+        with ProgressReader(clio.ifp, **progress_options(outfile, progress, ascii, width)) as reader:
+            counts = check_digests(
+                reader.readlines(),
+                clio.ofp,
+                Path(base_dir),
+                block_size,
+                jobs=jobs,
+                executor=executor,
+                fail_fast=fail_fast,
+                io=io,
+            )
+    for warning in check_warnings(counts):
+        click.echo(f"hashtree: WARNING: {warning}", err=True)
+    return 1 if check_failed(counts) else 0
+
+
+def watch_listing(base_dir, outfile, *, watch, hash=None, block_size=None, io=None, jobs=1, executor=None):
+    """keep the listing outfile of the files below base_dir current, checking every watch seconds; return 0
+
+    Runs until interrupted.
+    """
+    if is_stdio(outfile):
+        raise RuntimeError("--watch requires an output file")
+    base = Path(base_dir)
+    hasher = HashDigest(base, hash, block_size, io)
+    try:
+        watch_tree(base, hasher, partial(replace_listing, outfile), watch, jobs, executor)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def merge_shards(outfile, *, merge, format=None, sort_output=False):
+    """write the shard listings merge, merged into one listing, to outfile; return 0"""
+    if format not in (None, "bsd"):
+        raise RuntimeError("--merge requires the bsd format")
+    with ExitStack() as stack:
+        streams = [stack.enter_context(Path(listing).open("r")) for listing in merge]
+        with CLIO(None, outfile) as clio:
+            clio.ofp.writelines(line + "\n" for line in merge_listings(streams, sort_output))
+    return 0
+
+
+def list_duplicates(
+    base_dir,
+    infile,
+    outfile,
+    *,
+    find=True,
+    null=False,
+    hash=None,
+    block_size=None,
+    io=None,
+    jobs=1,
+    executor=None,
+    sort_files=True,
+    sort_args=None,
+    sort_memory=None,
+    temp_dir=None,
+):
+    """write the groups of identical files below base_dir, or listed in infile, to outfile; return 0
+
+    Groups are separated by blank lines.
+    """
     base = Path(base_dir)
-    if sort_args is None:
-        sort_args = DEFAULT_SORT_ARGS
+    separator = "\0" if null else "\n"
+    files, infile = list_files(
+        base, infile, find, separator, sort_files, sort_args or DEFAULT_SORT_ARGS, sort_memory, temp_dir
+    )
+    hasher = HashDigest(base, hash, block_size, io)
+    with CLIO(None if files is not None else infile, outfile, newline=list_newline(separator)) as clio:
+        if files is None:
+            files = ((filename, None) for filename in read_file_list(base, clio.ifp, separator))
+        for index, (digests, paths) in enumerate(find_duplicates(base, hasher, files, jobs, executor)):
+            if index:
+                clio.ofp.write("\n")
+            for path in paths:
+                clio.ofp.write(hasher.format(path, digests) + "\n")
+    return 0
 
-    if progress is None and is_stdio(outfile):
-        progress = False
 
-    if find:
-        infile = find_files(base, infile)
-    elif is_stdio(infile):
-        infile = spool_stdin()
+# options that select a mode other than hashing, and the function cli runs for each
+MODES = dict(check=check_tree, watch=watch_listing, merge=merge_shards, duplicates=list_duplicates)
 
-    if sort_files:
-        sort_file(infile, sort_args)
 
-    # if sorting output, redirect to tempfile
-    if sort_output:
-        sorted_outfile = outfile
-        outfile = create_tempfile()
-    else:
-        sorted_outfile = None
+def progress_options(outfile, progress=False, ascii=False, width=None):
+    """return tqdm keyword arguments for the progress options; progress None shows it unless writing to stdout"""
+    if progress is None and is_stdio(outfile):
+        progress = False
 
     progress_kwargs = {}
 
@@ -151,32 +547,286 @@ def hashtree(
         progress_kwargs["disable"] = not progress
     if width is not None:
         progress_kwargs["ncols"] = width
+    return progress_kwargs
+
+
+def check_options(outfile, hasher, format, cache, update, journal, resume, metadata, tree, shard, sort_output):
+    """raise RuntimeError for hashing options that cannot be combined"""
+    if sum(map(bool, [cache, update, journal])) > 1:
+        raise RuntimeError("--cache, --update and --journal are mutually exclusive")
+    if resume and not journal:
+        raise RuntimeError("--resume requires --journal")
+    if format != "bsd" and (update or sort_output):
+        raise RuntimeError("--update and --sort-output require the bsd format")
+    if format == "gnu" and len(hasher.hashes) > 1:
+        # gnu lines do not name their hash, so no one checker could verify a listing of several
+        raise RuntimeError("--format gnu writes one hash; run once per hash")
+    if metadata and is_stdio(outfile):
+        raise RuntimeError("cannot write stat sidecar for stdout")
+    if shard is not None and tree:
+        raise RuntimeError("--tree requires the whole tree, not a shard")
+
+
+def check_engine(hasher, engine=None, executor=None):
+    """raise RuntimeError for io and executor options the engine cannot honor"""
+    if engine != "asyncio":
+        return
+    # the asyncio engine always reads files, on threads of its own
+    if hasher.io != DEFAULT_IO or executor not in (None, DEFAULT_EXECUTOR):
+        raise RuntimeError("--engine asyncio reads files on threads; it takes no --io or --executor")
+
+
+def list_files(
+    base,
+    infile,
+    find=True,
+    separator="\n",
+    sort_files=True,
+    sort_args=DEFAULT_SORT_ARGS,
+    sort_memory=None,
+    temp_dir=None,
+    shard=None,
+    stats=None,
+):
+    """return (files, infile) for the files to hash
+
+    A walk the walker can order itself returns (filename, DirEntry) pairs as
+    files, produced lazily and teed to infile when it names a file.
+    Otherwise files is None and infile names the file list, written by a
+    walk or spooled from stdin, then cut to shard (index, count) and sorted.
+    """
+    # the walker sorts in-process unless sort is asked for a different order
+    if find and (not sort_files or sort_args == DEFAULT_SORT_ARGS):
+        files = walk_files(base, sort_files)
+        if shard is not None:
+            files = select_shard(files, *shard)
+        files = timed(stats, "walk", files)
+        if infile not in [".", "-", None]:
+            files = tee_file_list(files, infile, separator)
+        return files, infile
+
+    if find:
+        with stage(stats, "walk"):
+            infile = find_files(base, infile, temp_dir, separator)
+    elif is_stdio(infile):
+        with stage(stats, "list"):
+            infile = spool_stdin(temp_dir, separator)
+
+    if shard is not None:
+        with stage(stats, "shard"):
+            infile = shard_file(base, infile, shard, temp_dir, separator)
+
+    if sort_files:
+        with stage(stats, "sort"):
+            sort_file(infile, sort_args, sort_memory, temp_dir, separator)
+    return None, infile
+
+
+def total_walk(base, shard=None):
+    """return an unsorted walk of the files list_files walks, to total their sizes"""
+    files = walk_files(base, sort=False)
+    return files if shard is None else select_shard(files, *shard)
+
+
+def open_cache(base, cache=None, update=None, journal=None, resume=False, sidecar=None):
+    """return the digest cache context for the cache options; a sidecar needs one that stats files"""
+    if update:
+        return ListingCache(update, base)
+    if cache:
+        return DigestCache(cache, base)
+    if journal:
+        return JournalCache(journal, base, resume)
+    if sidecar:
+        return StatCache(base)
+    return nullcontext()
+
+
+def place_listing(spool, listing, sort_output, sort_args, memory=None, temp_dir=None, stats=None):
+    """move the listing written to spool to listing, sorting it on the way with sort_output"""
+    if not sort_output:
+        os.replace(spool, listing)
+        return
+    with stage(stats, "sort_output"):
+        write_sorted_output(spool, listing, sort_args, memory, temp_dir)
+
+
+def generate_hash_digests(
+    base,
+    infile,
+    outfile,
+    hasher,
+    progress_kwargs,
+    files=None,
+    total_files=None,
+    stream=False,
+    progress_unit=None,
+    separator="\n",
+    stats=None,
+    **options,
+):
+    """write digests for the files listed in infile, or for (filename, DirEntry) pairs from files
+
+    With stream, the file list is produced in a background thread so hashing
+    starts while the walk or list read is still running. With progress_unit
+    'bytes', file sizes are totalled in the background from a second read of
+    infile or, with files, from total_files, which lists the same files
+    again. File names in infile are separated by separator. stats and the
+    other options are passed to write_digests.
+    """
+    with (
+        CLIO(None if files is not None else infile, outfile, newline=list_newline(separator)) as clio,
+        ExitStack() as stack,
+    ):
+        bar = None
+        if progress_unit == "bytes":
+            bar = stack.enter_context(tqdm(**BYTE_PROGRESS, **progress_kwargs))
+            sizes = file_sizes(base, listed_files(base, infile, separator) if files is None else total_files)
+            stack.enter_context(background_total(bar, sizes))
+
+        walked = files is not None
+        if not walked:
+            if bar is None:
+                reader = stack.enter_context(ProgressReader(clio.ifp, separator, **progress_kwargs))
+                names = relative_filenames(base, reader.readlines())
+            else:
+                names = read_file_list(base, clio.ifp, separator)
+            files = timed(stats, "list", ((filename, None) for filename in names))
+        if stream:
+            files = prefetch(files)
+        if walked and bar is None:
+            files = stack.enter_context(tqdm(files, unit=" files", **progress_kwargs))
+
+        write_digests(files, clio.ofp, hasher, progress=bar, stats=stats, **options)
+
+
+def write_digests(
+    files,
+    ofp,
+    hasher,
+    jobs=1,
+    executor=None,
+    cache=None,
+    sidecar_ofp=None,
+    tree=None,
+    ordered=False,
+    engine=None,
+    concurrency=None,
+    progress=None,
+    format=None,
+    links=False,
+    stats=None,
+):
+    """write digests for (filename, DirEntry) pairs from files to ofp
+
+    With sidecar_ofp, the size and mtime of each file are written to that
+    stream; it requires a cache that stats files. Each digest is also added
+    to tree when one is given. With ordered, the files arrive in sort order
+    and the output is written in the order sort_output would produce.
+    progress is a tqdm bar advanced by each file's size. Lines are written
+    in the given format. With links, each hard-linked inode is hashed once.
+    With stats, a RunStats, each stage is timed and each file counted.
+    """
+    output = (SortedBSDWriter if ordered else WRITERS[format or DEFAULT_FORMAT])(ofp, hasher.hashes)
+
+    if cache is None:
+        # progress in bytes, some formats, hard link detection and stats need each file's stat
+        needs_stat = progress is not None or output.needs_stat or links or stats is not None
+        cache = StatCache(hasher.base_path) if needs_stat else NoCache()
+
+    if progress is not None:
+        progress = BatchedProgress(progress)
+
+    results = cache.file_digests(hasher, files, jobs, executor, engine, concurrency, links)
+    if stats is not None:
+        results = stats.counted(results)
+
+    for filename, stat, digests in results:
+        output.write(filename, stat, digests)
+        if sidecar_ofp is not None:
+            sidecar_ofp.write(format_sidecar_line(filename, stat) + "\n")
+        if tree is not None:
+            tree.add(filename, digests[0])
+        if progress is not None and stat is not None:
+            progress.update(stat.st_size)
+
+    output.flush()
+    if stats is not None:
+        stats.add_cache(cache)
+    if progress is not None:
+        progress.flush()
+
+
+@contextmanager
+def replacing_output(filename):
+    """open a temp file beside filename for writing, replacing filename with it on success"""
+    if filename is None:
+        yield None
+        return
+    tempfile = create_tempfile(Path(filename).parent)
+    with Path(tempfile).open("w") as ofp:
+        yield ofp
+    os.replace(tempfile, filename)
+
 
-    generate_hash_digests(base, infile, outfile, hash, progress_kwargs)
+def relative_filenames(base, filenames):
+    for filename in filenames:
+        if filename.startswith(str(base)):
+            filename = Path(filename).relative_to(base)
+        yield filename
 
-    if sorted_outfile:
-        write_sorted_output(outfile, sorted_outfile, sort_args)
 
+def read_file_list(base, ifp, separator="\n"):
+    """yield the relative file names listed in ifp, one per line or separated by separator"""
+    return relative_filenames(base, iter_lines(ifp, separator))
 
-def generate_hash_digests(base, infile, outfile, hash, progress_kwargs):
-    hasher = HashDigest(base, hash)
-    with CLIO(infile, outfile) as clio:
-        with ProgressReader(clio.ifp, **progress_kwargs) as reader:
-            for filename in reader.readlines():
-                if filename.startswith(str(base)):
-                    filename = Path(filename).relative_to(base)
-                digest = hasher.file_digest(filename)
-                clio.ofp.write(digest + "\n")
+
+def file_sizes(base, files):
+    """yield the size of each of (filename, DirEntry) pairs, statting files that have no entry"""
+    for filename, entry in files:
+        try:
+            stat = os.stat(base / filename) if entry is None else entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        yield stat.st_size
+
+
+def listed_files(base, filename, separator="\n"):
+    """yield (filename, None) for each file listed in filename"""
+    with Path(filename).open("r", newline=list_newline(separator)) as ifp:
+        for listed in read_file_list(base, ifp, separator):
+            yield listed, None
+
+
+def shard_file(base, filename, shard, temp_dir=None, separator="\n"):
+    """return a temp file listing the files in filename that belong to shard (index, count)"""
+    tempfile = create_tempfile(temp_dir)
+    newline = list_newline(separator)
+    with Path(filename).open("r", newline=newline) as ifp, Path(tempfile).open("w", newline=newline) as ofp:
+        files = ((str(filename), None) for filename in read_file_list(base, ifp, separator))
+        for filename, _ in select_shard(files, *shard):
+            ofp.write(filename + separator)
+    return tempfile
+
+
+def tee_file_list(files, filename, separator="\n"):
+    """write each file name to filename as it is passed through"""
+    with Path(filename).open("w", newline=list_newline(separator)) as ofp:
+        for file in files:
+            ofp.write(file[0] + separator)
+            yield file
 
 
-def write_sorted_output(spool, outfile, sort_args):
-    sort_file(spool, sort_args)
+def write_sorted_output(spool, outfile, sort_args, memory=None, temp_dir=None):
+    if sort_args != DEFAULT_SORT_ARGS:
+        sort_file(spool, sort_args, temp_dir=temp_dir)
+        with CLIO(spool, outfile) as clio:
+            copy_stream(clio.ifp, clio.ofp)
+        return
+
     with Path(spool).open("r") as ifp:
-        if is_stdio(outfile):
-            copy_stream(ifp, sys.stdout)
-        else:
-            with Path(outfile).open("w") as ofp:
-                copy_stream(ifp, ofp)
+        lines = sort_lines((line.rstrip("\n") for line in ifp), memory, temp_dir)
+    with CLIO(None, outfile) as clio:
+        clio.ofp.writelines(line + "\n" for line in lines)
 
 
 def copy_stream(in_stream, out_stream):
@@ -188,9 +838,12 @@ def copy_stream(in_stream, out_stream):
             return
 
 
-def spool_stdin():
-    tempfile = create_tempfile()
-    with Path(tempfile).open("w") as ofp:
+def spool_stdin(temp_dir=None, separator="\n"):
+    newline = list_newline(separator)
+    tempfile = create_tempfile(temp_dir)
+    if newline is not None and hasattr(sys.stdin, "reconfigure"):
+        sys.stdin.reconfigure(newline=newline)
+    with Path(tempfile).open("w", newline=newline) as ofp:
         copy_stream(sys.stdin, ofp)
     return tempfile
 
@@ -199,16 +852,27 @@ def is_stdio(filename):
     return filename in ("-", None)
 
 
-def sort_file(filename, sort_args):
+def sort_file(filename, sort_args, memory=None, temp_dir=None, separator="\n"):
 
     if is_stdio(filename):
         raise RuntimeError("cannot sort stdio")
 
+    # the default order is sorted in-process, independent of the host's sort and locale
+    if sort_args == DEFAULT_SORT_ARGS:
+        newline = list_newline(separator)
+        with Path(filename).open("r", newline=newline) as ifp:
+            lines = sort_lines(iter_lines(ifp, separator), memory, temp_dir)
+        with Path(filename).open("w", newline=newline) as ofp:
+            ofp.writelines(line + separator for line in lines)
+        return
+
     cmd = shlex.split(sort_args)
     cmd.insert(0, "sort")
+    if separator == "\0":
+        cmd.insert(1, "-z")
 
-    # use system sort to handle huge streams
-    with NamedTemporaryFile(delete=False, dir=".") as ofp:
+    # use system sort for other orders
+    with NamedTemporaryFile(delete=False, dir=temp_dir) as ofp:
         with Path(filename).open("r") as ifp:
             subprocess.run(cmd, stdin=ifp, stdout=ofp, check=True, text=True)
         ofp.close()
@@ -223,26 +887,27 @@ def sort_file(filename, sort_args):
                 raise
 
 
-def create_tempfile():
-    filename = NamedTemporaryFile(delete=False, dir=".", prefix="hashtree_file_list").name
+def create_tempfile(dir=None):
+    filename = NamedTemporaryFile(delete=False, dir=dir, prefix="hashtree_file_list").name
     atexit.register(reaper, filename)
     return filename
 
 
-def find_files(base, filename):
+def find_files(base, filename, temp_dir=None, separator="\n"):
 
     if filename in [".", "-", None]:
-        filename = create_tempfile()
+        filename = create_tempfile(temp_dir)
 
-    with Path(filename).open("w") as ofp:
-        subprocess.run(["find", ".", "-type", "f"], cwd=str(base), stdout=ofp, check=True, text=True)
+    with Path(filename).open("w", newline=list_newline(separator)) as ofp:
+        for path, _ in walk_files(base, sort=False):
+            ofp.write(path + separator)
 
     return filename
 
 
 def reaper(filename):
     """delete a file"""
-    Path(filename).unlink()
+    Path(filename).unlink(missing_ok=True)
 
 
 if __name__ == "__main__":
@@ -5,10 +5,17 @@ from pathlib import Path
 
 
 class CLIO:
-    def __init__(self, infile=None, outfile=None, binary=False):
+    """open infile and outfile, or stdin and stdout for '-' or None
+
+    newline is passed to open() for infile, and set on stdin, so a file list
+    separated by something other than newlines can be read untranslated.
+    """
+
+    def __init__(self, infile=None, outfile=None, binary=False, newline=None):
         self.opened = []
         self.infile = infile
         self.outfile = outfile
+        self.newline = newline
         if binary:
             self.imode = "rb"
             self.omode = "wb"
@@ -19,8 +26,10 @@ class CLIO:
     def __enter__(self):
         if self.infile in ["-", None]:
             self.ifp = sys.stdin
+            if self.newline is not None and hasattr(self.ifp, "reconfigure"):
+                self.ifp.reconfigure(newline=self.newline)
         else:
-            self.ifp = Path(self.infile).open(self.imode)
+            self.ifp = Path(self.infile).open(self.imode, newline=self.newline)
             self.opened.insert(0, self.ifp)
         if self.outfile in ["-", None]:
             self.ofp = sys.stdout
@@ -34,3 +43,35 @@ class CLIO:
             stream.close()
         self.opened = []
         return False
+
+
+# characters read per chunk when splitting on a separator other than newline
+READ_CHUNK = 1024 * 1024
+
+
+def list_newline(separator):
+    """return the newline argument for opening a file list separated by separator
+
+    Universal newlines would turn a carriage return within a NUL-separated
+    name into a newline, so only newline-separated lists are translated.
+    """
+    return None if separator == "\n" else ""
+
+
+def iter_lines(stream, separator="\n"):
+    """yield the records of a text stream split on separator, without it
+
+    Newline-separated streams are iterated natively; any other separator,
+    such as NUL for 'find -print0' output, is split from large chunks.
+    """
+    if separator == "\n":
+        for line in stream:
+            yield line.rstrip("\n")
+        return
+    tail = ""
+    while chunk := stream.read(READ_CHUNK):
+        records = (tail + chunk).split(separator)
+        tail = records.pop()
+        yield from records
+    if tail:
+        yield tail
@@ -0,0 +1,86 @@
+"""find files with identical contents, hashing as little as possible"""
+
+import hashlib
+import os
+from collections import defaultdict
+from functools import partial
+
+from .pool import ordered_map
+from .sort import sort_key
+
+# bytes hashed from each end of a file to split a size bucket before full hashing
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+
+def _size(base, filename, entry):
+    try:
+        if entry is None:
+            return os.lstat(base / filename).st_size
+        return entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        return None
+
+
+def _sample_digest(hasher, sample_size, item):
+    """return a digest of the first and last sample_size bytes of a file, or None if it is gone"""
+    filename, size = item
+    sample = hashlib.new(hasher.hash.lower())
+    try:
+        with (hasher.base_path / filename).open("rb") as ifp:
+            sample.update(ifp.read(sample_size))
+            ifp.seek(max(sample_size, size - sample_size))
+            sample.update(ifp.read(sample_size))
+    except FileNotFoundError:
+        return None
+    return sample.hexdigest()
+
+
+def _full_digests(hasher, filename):
+    try:
+        return hasher.digests(filename)
+    except FileNotFoundError:
+        return None
+
+
+def _split(groups, func, jobs, executor):
+    """split each group of items by func(item), dropping items where it is None and groups left with one item"""
+    groups = [group for group in groups if len(group) > 1]
+    items = [item for group in groups for item in group]
+    keys = ordered_map(func, items, jobs, executor)
+    split = defaultdict(list)
+    for index, group in enumerate(groups):
+        for item in group:
+            key = next(keys)
+            if key is not None:
+                split[(index, key)].append(item)
+    return [(key, group) for (_, key), group in split.items() if len(group) > 1]
+
+
+def find_duplicates(base, hasher, files, jobs=1, executor=None, sample_size=None):
+    """return [(digests, paths)] for each group of files below base with identical contents
+
+    files are (filename, DirEntry) pairs, as from walk_files; the entry may
+    be None. Files are first grouped by size, and sizes seen once are never
+    read. Buckets of files larger than twice sample_size are split by a
+    digest of their first and last sample_size bytes; only the files still
+    sharing a bucket are hashed in full. Groups and the paths in each are in
+    sort order.
+    """
+
+    if sample_size is None:
+        sample_size = DEFAULT_SAMPLE_SIZE
+
+    sizes = defaultdict(list)
+    for filename, entry in files:
+        size = _size(base, filename, entry)
+        if size is not None:
+            sizes[size].append((filename, size))
+
+    small = [group for size, group in sizes.items() if size <= 2 * sample_size]
+    large = [group for size, group in sizes.items() if size > 2 * sample_size]
+    sampled = _split(large, partial(_sample_digest, hasher, sample_size), jobs, executor)
+    candidates = [[filename for filename, _ in group] for group in small + [group for _, group in sampled]]
+
+    duplicates = _split(candidates, partial(_full_digests, hasher), jobs, executor)
+    groups = [(digests, sorted(paths, key=sort_key)) for digests, paths in duplicates]
+    return sorted(groups, key=lambda group: sort_key(group[1][0]))
@@ -0,0 +1,164 @@
+"""digest listing output formats, and a reader for the binary format"""
+
+import hashlib
+import json
+import struct
+from collections import namedtuple
+
+from .hash import dot_path, format_digest_line
+from .sort import SortedWriter
+
+# bsd: 'SHA256 (./path) = hex', one line per hash
+# gnu: 'hex  ./path' as sha256sum writes it, one line per hash
+# jsonl: one JSON object per file with its path, size, mtime_ns and a key per hash
+# binary: a header naming the hashes, then a length-prefixed record per file
+FORMATS = ["bsd", "gnu", "jsonl", "binary"]
+
+DEFAULT_FORMAT = "bsd"
+
+BINARY_MAGIC = b"HASHTREE"
+
+BINARY_VERSION = 1
+
+# magic, version, number of hashes; each hash follows as name length, name, digest length
+BINARY_HEADER = struct.Struct("<8sBB")
+BINARY_HASH = struct.Struct("<B")
+
+# path length, size, mtime_ns; followed by the path and each raw digest
+BINARY_RECORD = struct.Struct("<IQq")
+
+DigestRecord = namedtuple("DigestRecord", ["path", "size", "mtime_ns", "digests"])
+
+
+def _encode_path(filename):
+    return dot_path(filename).encode("utf-8", "surrogateescape")
+
+
+class BSDWriter:
+    """write listing lines for each file to a text stream"""
+
+    needs_stat = False
+
+    def __init__(self, ofp, hashes):
+        self.ofp = ofp
+        self.hashes = hashes
+
+    def write(self, filename, stat, digests):
+        for hash, digest in zip(self.hashes, digests):
+            self.ofp.write(format_digest_line(hash, filename, digest) + "\n")
+
+    def flush(self):
+        """write out any lines held back"""
+
+
+class SortedBSDWriter(BSDWriter):
+    """write bsd lines in --sort-output order for files that arrive in sorted walk order
+
+    Results arrive in file order; the SortedWriter only fixes up lines whose
+    sort keys tie.
+    """
+
+    def __init__(self, ofp, hashes):
+        super().__init__(ofp, hashes)
+        self.writer = SortedWriter(ofp)
+
+    def write(self, filename, stat, digests):
+        path = dot_path(filename)
+        for hash, digest in zip(self.hashes, digests):
+            self.writer.write(format_digest_line(hash, filename, digest), f"{hash} ({path}")
+
+    def flush(self):
+        self.writer.flush()
+
+
+class GNUWriter(BSDWriter):
+    def write(self, filename, stat, digests):
+        path = dot_path(filename)
+        # coreutils marks a name containing a backslash or newline with a leading backslash and escapes it
+        prefix = ""
+        if "\\" in path or "\n" in path:
+            prefix = "\\"
+            path = path.replace("\\", "\\\\").replace("\n", "\\n")
+        for digest in digests:
+            self.ofp.write(f"{prefix}{digest}  {path}\n")
+
+
+class JSONLWriter(BSDWriter):
+    needs_stat = True
+
+    def write(self, filename, stat, digests):
+        record = dict(path=dot_path(filename), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        record.update(zip((hash.lower() for hash in self.hashes), digests))
+        self.ofp.write(json.dumps(record) + "\n")
+
+
+class BinaryWriter(BSDWriter):
+    """write records to the binary stream beneath a text stream"""
+
+    needs_stat = True
+
+    def __init__(self, ofp, hashes):
+        if hasattr(ofp, "buffer"):
+            ofp.flush()
+            ofp = ofp.buffer
+        super().__init__(ofp, hashes)
+        header = [BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(hashes))]
+        for hash in hashes:
+            name = hash.encode("ascii")
+            size = hashlib.new(hash.lower()).digest_size
+            header.append(BINARY_HASH.pack(len(name)) + name + BINARY_HASH.pack(size))
+        self.ofp.write(b"".join(header))
+
+    def write(self, filename, stat, digests):
+        path = _encode_path(filename)
+        raw = b"".join(bytes.fromhex(digest) for digest in digests)
+        self.ofp.write(BINARY_RECORD.pack(len(path), stat.st_size, stat.st_mtime_ns) + path + raw)
+
+
+WRITERS = {"bsd": BSDWriter, "gnu": GNUWriter, "jsonl": JSONLWriter, "binary": BinaryWriter}
+
+
+class BinaryReader:
+    """iterate the DigestRecords of a binary listing read from a binary stream
+
+    hashes names the hash of each raw digest in a record's digests, in order.
+    """
+
+    def __init__(self, ifp):
+        self.ifp = ifp
+        magic, version, count = BINARY_HEADER.unpack(self._read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("not a hashtree binary listing")
+        self.hashes = []
+        self.sizes = []
+        for _ in range(count):
+            (length,) = BINARY_HASH.unpack(self._read(BINARY_HASH.size))
+            self.hashes.append(self._read(length).decode("ascii"))
+            (size,) = BINARY_HASH.unpack(self._read(BINARY_HASH.size))
+            self.sizes.append(size)
+
+    def _read(self, count):
+        data = self.ifp.read(count)
+        if len(data) != count:
+            raise ValueError("truncated hashtree binary listing")
+        return data
+
+    def __iter__(self):
+        read = self.ifp.read
+        digest_size = sum(self.sizes)
+        offsets = [sum(self.sizes[:index]) for index in range(len(self.sizes) + 1)]
+        while head := read(BINARY_RECORD.size):
+            if len(head) != BINARY_RECORD.size:
+                raise ValueError("truncated hashtree binary listing")
+            length, size, mtime_ns = BINARY_RECORD.unpack(head)
+            data = self._read(length + digest_size)
+            path = data[:length].decode("utf-8", "surrogateescape")
+            raw = data[length:]
+            digests = tuple(raw[start:end] for start, end in zip(offsets, offsets[1:]))
+            yield DigestRecord(path, size, mtime_ns, digests)
+
+
+def read_binary(filename):
+    """yield the DigestRecords of a binary listing file"""
+    with open(filename, "rb") as ifp:
+        yield from BinaryReader(ifp)
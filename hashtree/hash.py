@@ -2,18 +2,60 @@
 
 # pure python cli
 
+import errno
 import hashlib
+import mmap
+import os
+import threading
 from pathlib import Path
 
 HASHES = list(set(hashlib.algorithms_guaranteed).difference({"shake_128", "shake_256"}))
 
 DEFAULT_HASH = "sha256"
 
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# read: buffered reads into a reusable buffer
+# mmap: hash slices of a read-only mapping, avoiding a copy per block
+# auto: mmap for files of at least MMAP_THRESHOLD bytes, read otherwise
+# sparse: read only the data regions of files with holes, hashing zeros for the holes
+# a mapped file truncated while it is hashed raises SIGBUS, so read is the default
+IO_MODES = ["read", "mmap", "auto", "sparse"]
+
+DEFAULT_IO = "read"
+
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+
+def format_digest_line(hash, filename, digest):
+    return f"{hash} ({dot_path(filename)}) = {digest}"
+
+
+def dot_path(filename):
+    """return filename as it appears in a digest listing: './' followed by the relative path"""
+    filename = str(filename)
+    if filename.startswith("./"):
+        return filename
+    return "./" + filename
+
 
 class HashDigest:
-    def __init__(self, base_path=None, hash=None):
+    def __init__(self, base_path=None, hash=None, block_size=None, io=None, mmap_threshold=None):
+        self._local = threading.local()
         self.set_base_path(base_path)
         self.set_hash(hash)
+        self.set_block_size(block_size)
+        self.set_io(io, mmap_threshold)
+
+    def __getstate__(self):
+        # read buffers and the zero block are per-thread and are not sent to worker processes
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
 
     def set_base_path(self, path=None):
         if path is None:
@@ -21,17 +63,152 @@ class HashDigest:
         self.base_path = Path(path)
 
     def set_hash(self, hash=None):
+        """select one hash name or a list of names; each file is read once for all of them"""
         if hash is None:
             hash = DEFAULT_HASH
-        self._hash = getattr(hashlib, hash.lower())
-        self.hash = hash.upper()
+        if isinstance(hash, str):
+            hash = [hash]
+        hashes = list(dict.fromkeys(name.upper() for name in hash))
+        if not hashes:
+            raise ValueError("no hash selected")
+        self._hashes = [getattr(hashlib, name.lower()) for name in hashes]
+        self.hashes = hashes
+        self.hash = hashes[0]
+
+    def set_block_size(self, block_size=None):
+        if block_size is None:
+            block_size = DEFAULT_BLOCK_SIZE
+        if block_size < 1:
+            raise ValueError(f"invalid block size: {block_size}")
+        self.block_size = block_size
+        self._local = threading.local()
+
+    def set_io(self, io=None, mmap_threshold=None):
+        if io is None:
+            io = DEFAULT_IO
+        if io not in IO_MODES:
+            raise ValueError(f"invalid io mode: {io}")
+        self.io = io
+        self.mmap_threshold = MMAP_THRESHOLD if mmap_threshold is None else mmap_threshold
+
+    def _use_mmap(self, size):
+        if size == 0:
+            return False
+        if self.io == "auto":
+            return size >= self.mmap_threshold
+        return self.io == "mmap"
+
+    def _buffer(self):
+        """return this thread's reusable read buffer"""
+        view = getattr(self._local, "view", None)
+        if view is None:
+            view = self._local.view = memoryview(bytearray(self.block_size))
+        return view
+
+    def _zeros(self):
+        """return a read-only block of zeros, hashed in place of holes"""
+        zeros = getattr(self._local, "zeros", None)
+        if zeros is None:
+            zeros = self._local.zeros = memoryview(bytes(self.block_size))
+        return zeros
+
+    def digests(self, filename):
+        """return a tuple of hex digests of file contents, one per hash, reading or mapping one block at a time"""
+        hashers = [new() for new in self._hashes]
+        with (self.base_path / filename).open("rb", buffering=0) as ifp:
+            if self.io == "read":
+                self._update_read(hashers, ifp)
+            elif self.io == "sparse":
+                stat = os.fstat(ifp.fileno())
+                # a file with fewer blocks allocated than its size covers has holes
+                if hasattr(os, "SEEK_DATA") and stat.st_blocks * 512 < stat.st_size:
+                    self._update_sparse(hashers, ifp, stat.st_size)
+                else:
+                    self._update_read(hashers, ifp)
+            elif self._use_mmap(os.fstat(ifp.fileno()).st_size):
+                self._update_mmap(hashers, ifp)
+            else:
+                self._update_read(hashers, ifp)
+        return tuple(hasher.hexdigest() for hasher in hashers)
+
+    def digest(self, filename):
+        """return hex digest of file contents for the first hash"""
+        return self.digests(filename)[0]
+
+    def _update_read(self, hashers, ifp):
+        view = self._buffer()
+        while count := ifp.readinto(view):
+            block = view[:count]
+            for hasher in hashers:
+                hasher.update(block)
+
+    def _update_sparse(self, hashers, ifp, size):
+        fd = ifp.fileno()
+        offset = 0
+        while offset < size:
+            try:
+                data = min(os.lseek(fd, offset, os.SEEK_DATA), size)
+            except OSError as exc:
+                if exc.errno != errno.ENXIO:
+                    # holes cannot be found on this filesystem; read the rest
+                    break
+                data = size  # only a hole remains
+            self._update_hole(hashers, data - offset)
+            offset = data
+            if offset >= size:
+                break
+            end = min(os.lseek(fd, offset, os.SEEK_HOLE), size)
+            os.lseek(fd, offset, os.SEEK_SET)
+            offset = self._update_data(hashers, ifp, offset, end)
+            if offset < end:
+                # truncated while it is hashed
+                return
+        # anything not covered above, including data appended since the file was opened
+        os.lseek(fd, offset, os.SEEK_SET)
+        self._update_read(hashers, ifp)
+
+    def _update_hole(self, hashers, length):
+        zeros = self._zeros()
+        for start in range(0, length, self.block_size):
+            block = zeros[: min(self.block_size, length - start)]
+            for hasher in hashers:
+                hasher.update(block)
+
+    def _update_data(self, hashers, ifp, offset, end):
+        """hash ifp from offset, where it is positioned, to end; return the offset reached, short of end at EOF"""
+        view = self._buffer()
+        while offset < end:
+            count = ifp.readinto(view[: min(len(view), end - offset)])
+            if not count:
+                break
+            block = view[:count]
+            for hasher in hashers:
+                hasher.update(block)
+            offset += count
+        return offset
+
+    def _update_mmap(self, hashers, ifp):
+        with mmap.mmap(ifp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                for offset in range(0, len(view), self.block_size):
+                    end = offset + self.block_size
+                    block = view[offset:end]
+                    for hasher in hashers:
+                        hasher.update(block)
+                    block.release()
+
+    def cached_digest(self, item):
+        """return digests for a (filename, digests) pair, hashing the file only when digests is None"""
+        filename, digests = item
+        if digests is None:
+            digests = self.digests(filename)
+        return digests
+
+    def format(self, filename, digests):
+        """return the listing line for each hash, joined by newlines"""
+        return "\n".join(format_digest_line(hash, filename, digest) for hash, digest in zip(self.hashes, digests))
 
     def file_digest(self, filename):
-        file = self.base_path / filename
-        digest = self._hash(file.read_bytes()).hexdigest()
-        filename = str(filename)
-        if filename.startswith("./"):
-            prefix = ""
-        else:
-            prefix = "./"
-        return f"{self.hash} ({prefix}{filename}) = {digest}"
+        return self.format(filename, self.digests(filename))
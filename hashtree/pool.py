@@ -0,0 +1,129 @@
+"""ordered parallel map over thread or process pools"""
+
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+DEFAULT_EXECUTOR = "thread"
+
+# items sent to a worker process per task, amortizing the IPC round trip
+PROCESS_CHUNK_SIZE = 64
+
+# tasks kept in flight per worker
+WINDOW_FACTOR = 4
+
+# prefetch queue bounds: batches queued, and items per batch
+PREFETCH_BATCHES = 64
+PREFETCH_BATCH_SIZE = 256
+
+_DONE = object()
+
+
+def _call_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def _chunks(iterable, size):
+    items = iter(iterable)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def ordered_map(func, iterable, jobs=1, executor=None):
+    """yield func(item) for each item in input order, running up to jobs calls concurrently
+
+    jobs=0 selects one job per cpu; the number of queued tasks is bounded so the
+    input is consumed incrementally rather than read up front
+    """
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        yield from map(func, iterable)
+        return
+
+    if executor is None:
+        executor = DEFAULT_EXECUTOR
+
+    chunk_size = PROCESS_CHUNK_SIZE if executor == "process" else 1
+    chunks = _chunks(iterable, chunk_size)
+
+    if executor == "process":
+        # forking a multi-threaded process (e.g. the tqdm monitor) is unsafe
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = EXECUTORS[executor](max_workers=jobs)
+    try:
+        pending = deque(pool.submit(_call_chunk, func, chunk) for chunk in islice(chunks, jobs * WINDOW_FACTOR))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(_call_chunk, func, chunk))
+            yield from results
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _put(batches, stop, value):
+    """queue value, giving up once stop is set; return True if it was queued"""
+    while not stop.is_set():
+        try:
+            batches.put(value, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(iterable, batches, stop, batch_size):
+    """queue the items of iterable in batches, then (_DONE, the exception raised or None)"""
+    batch = []
+    try:
+        for item in iterable:
+            batch.append(item)
+            if len(batch) >= batch_size or batches.empty():
+                if not _put(batches, stop, batch):
+                    return
+                batch = []
+    except BaseException as exc:
+        _put(batches, stop, batch)
+        _put(batches, stop, (_DONE, exc))
+    else:
+        _put(batches, stop, batch)
+        _put(batches, stop, (_DONE, None))
+
+
+def prefetch(iterable, queue_size=PREFETCH_BATCHES, batch_size=PREFETCH_BATCH_SIZE):
+    """yield the items of iterable, producing them in a background thread
+
+    Items pass through a bounded queue, so the producer runs at most
+    queue_size * batch_size items ahead of the consumer. A batch is handed over
+    early whenever the queue is empty, so a waiting consumer never sits on a
+    partially filled batch.
+    """
+
+    batches = queue.Queue(queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce, args=(iterable, batches, stop, batch_size), name="hashtree-prefetch", daemon=True
+    )
+    producer.start()
+    try:
+        while True:
+            batch = batches.get()
+            if isinstance(batch, tuple):
+                _, exc = batch
+                if exc is not None:
+                    raise exc
+                return
+            yield from batch
+    finally:
+        stop.set()
+        producer.join()
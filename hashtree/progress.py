@@ -1,16 +1,85 @@
 import io
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 from tqdm import tqdm
 
+from .clio import iter_lines
+
+# files: count files hashed, or bytes of the file list read
+# bytes: total the file sizes up front and count bytes of files hashed
+PROGRESS_UNITS = ["files", "bytes"]
+
+DEFAULT_PROGRESS_UNIT = "files"
+
+BYTE_PROGRESS = dict(unit="B", unit_scale=True, unit_divisor=1024)
+
+# seconds between updates passed to the progress bar
+UPDATE_INTERVAL = 0.1
+
+# lines read between progress updates
+UPDATE_LINES = 256
+
+
+class BatchedProgress:
+    """accumulate progress, passing it to a tqdm bar at most once per interval"""
+
+    def __init__(self, bar, interval=UPDATE_INTERVAL):
+        self.bar = bar
+        self.interval = interval
+        self.pending = 0
+        self.next = time.monotonic() + interval
+
+    def update(self, count):
+        self.pending += count
+        now = time.monotonic()
+        if now >= self.next:
+            self.flush()
+            self.next = now + self.interval
+
+    def flush(self):
+        if self.pending:
+            self.bar.update(self.pending)
+            self.pending = 0
+
+
+@contextmanager
+def background_total(bar, sizes, interval=UPDATE_INTERVAL):
+    """sum sizes in a background thread, raising bar's total at most once per interval as they come in"""
+    stop = threading.Event()
+
+    def run():
+        total = 0
+        next = time.monotonic() + interval
+        for size in sizes:
+            if stop.is_set():
+                return
+            total += size
+            now = time.monotonic()
+            if now >= next:
+                bar.total = total
+                next = now + interval
+        bar.total = total
+
+    thread = threading.Thread(target=run, name="hashtree-total", daemon=True)
+    thread.start()
+    try:
+        yield thread
+    finally:
+        stop.set()
+        thread.join()
+
 
 class ProgressReader:
+    """read lines from a stream, showing progress in bytes if it is seekable, lines otherwise"""
 
-    def __init__(self, in_stream, **kwargs):
+    def __init__(self, in_stream, separator="\n", **kwargs):
 
         self.tqdm = None
-        self.buffer = ""
+        # updates are already limited by BatchedProgress; each one should be shown
         kwargs.setdefault("miniters", 1)
 
         if in_stream.seekable():
@@ -20,12 +89,11 @@ class ProgressReader:
             kwargs.setdefault("total", tail - head)
             kwargs.setdefault("unit", " bytes")
             kwargs.setdefault("unit_scale", True)
-            self.count = 0
         else:
             kwargs.setdefault("unit", " lines")
-            self.count = None
         self.kwargs = kwargs
         self.in_stream = in_stream
+        self.separator = separator
 
     def __enter__(self):
         self.tqdm = tqdm(**self.kwargs)
@@ -37,31 +105,28 @@ class ProgressReader:
             self.tqdm = None
         return False
 
-    def _update(self, len):
-        if self.tqdm.total:
-            self.tqdm.update(len + 1)
-        else:
-            self.tqdm.update(1)
-
     def readlines(self):
-        while True:
-            chunk = self.in_stream.readline()
-            self.buffer += chunk
-            while "\n" in self.buffer:
-                line, _, self.buffer = self.buffer.partition("\n")
-                self._update(len(line))
+        """yield each line without its separator"""
+        progress = BatchedProgress(self.tqdm)
+        sized = bool(self.tqdm.total)
+        count = size = 0
+        try:
+            for line in iter_lines(self.in_stream, self.separator):
+                count += 1
+                if sized:
+                    size += len(line) + 1
                 yield line
-            if not chunk:
-                if self.buffer:
-                    self._update(len(self.buffer))
-                    yield self.buffer
-                return
+                # checking the clock every line costs more than reading it
+                if not count % UPDATE_LINES:
+                    progress.update(size if sized else UPDATE_LINES)
+                    size = 0
+        finally:
+            progress.update(size if sized else count % UPDATE_LINES)
+            progress.flush()
 
 
 if __name__ == "__main__":
 
-    import time
-
     import click
 
     @click.command("progress")
@@ -86,7 +151,7 @@ if __name__ == "__main__":
 
         try:
             with ProgressReader(infile) as reader:
-                for line in reader.lines():
+                for line in reader.readlines():
                     outfile.write(line + "\n")
                     if delay:
                         time.sleep(delay)
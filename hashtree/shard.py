@@ -0,0 +1,53 @@
+"""split one run across several nodes, and merge their listings into one"""
+
+import heapq
+import zlib
+
+from .check import parse_digest_line
+from .hash import dot_path
+from .sort import sort_key
+
+
+def parse_shard(value):
+    """return (index, count) from 'K/N', where 1 <= K <= N"""
+    try:
+        index, count = (int(field) for field in value.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must be K/N, not {value!r}") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {value!r} is not one of 1/{count} to {count}/{count}")
+    return index, count
+
+
+def shard_of(filename, count):
+    """return the shard, 1 to count, that filename belongs to
+
+    The partition depends only on the './'-prefixed path, so every node
+    assigns each file to the same shard whatever order it lists them in.
+    """
+    return zlib.crc32(dot_path(filename).encode("utf-8", "surrogateescape")) % count + 1
+
+
+def select_shard(files, index, count):
+    """yield the (filename, DirEntry) pairs among files that belong to shard index of count"""
+    for file in files:
+        if shard_of(file[0], count) == index:
+            yield file
+
+
+def _path_key(line):
+    parsed = parse_digest_line(line)
+    if parsed is None:
+        raise ValueError(f"not a digest line: {line!r}")
+    return sort_key(dot_path(parsed[1]))
+
+
+def merge_listings(streams, sort_output=False):
+    """yield the lines of sorted shard listings (without newlines) merged into one listing
+
+    Listings written in file order are merged by path, keeping the lines for
+    each file together; with sort_output, listings sorted with --sort-output
+    are merged by whole line. Only one line per listing is held at a time.
+    """
+    lines = [(line.rstrip("\n") for line in stream) for stream in streams]
+    return heapq.merge(*lines, key=sort_key if sort_output else _path_key)
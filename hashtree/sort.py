@@ -0,0 +1,101 @@
+"""in-process sorting matching the default 'sort' arguments"""
+
+import heapq
+import string
+import tempfile
+
+from .clio import iter_lines
+
+DEFAULT_SORT_ARGS = "-ifdk1.1"
+
+DEFAULT_SORT_MEMORY = 256 * 1024 * 1024
+
+# approximate bytes held per line in a run: the line, its key and list overhead
+LINE_OVERHEAD = 160
+
+# spilled runs merged at once; more are first merged into a single run
+MERGE_WIDTH = 64
+
+# sort -f: fold lower case to upper case
+_FOLD = bytes.maketrans(string.ascii_lowercase.encode(), string.ascii_uppercase.encode())
+
+# sort -d: consider only blanks and alphanumeric characters (C locale)
+_KEEP = (string.ascii_letters + string.digits + " \t").encode()
+_IGNORE = bytes(c for c in range(256) if c not in _KEEP)
+
+
+def sort_key(line):
+    """return a key ordering lines as 'sort -ifdk1.1' does in the C locale
+
+    The second element is the last-resort byte comparison sort applies to
+    lines whose keys compare equal.
+    """
+    encoded = line.encode("utf-8", "surrogateescape")
+    return encoded.translate(_FOLD, _IGNORE), encoded
+
+
+def sort_lines(lines, memory=None, temp_dir=None):
+    """sort lines (without newlines) by sort_key, returning an iterator over the result
+
+    The input is consumed before this returns. Sorted runs of about memory
+    bytes are spilled to temporary files in temp_dir and merged with a heap,
+    so memory use stays bounded for inputs of any size.
+    """
+
+    if memory is None:
+        memory = DEFAULT_SORT_MEMORY
+
+    runs = []
+    run, size = [], 0
+    for line in lines:
+        run.append(line)
+        size += len(line) * 2 + LINE_OVERHEAD
+        if size >= memory:
+            run.sort(key=sort_key)
+            runs.append(_spill(run, temp_dir))
+            run, size = [], 0
+            if len(runs) >= MERGE_WIDTH:
+                runs = [_spill(heapq.merge(*runs, key=sort_key), temp_dir)]
+    run.sort(key=sort_key)
+
+    if not runs:
+        return iter(run)
+    return heapq.merge(*runs, iter(run), key=sort_key)
+
+
+def _spill(lines, temp_dir):
+    # runs are NUL-separated, so lines may contain newlines
+    spool = tempfile.TemporaryFile("w+", dir=temp_dir, encoding="utf-8", errors="surrogateescape", newline="")
+    spool.writelines(line + "\0" for line in lines)
+    spool.seek(0)
+    return _read_run(spool)
+
+
+def _read_run(spool):
+    with spool:
+        yield from iter_lines(spool, "\0")
+
+
+class SortedWriter:
+    """write lines in sort_key order when the input is already nearly in that order
+
+    Each line comes with a prefix of it that sorts at or before the prefix
+    of every later line, as 'HASH (./path' does for a sorted file list.
+    Lines are held only until a later prefix shows that nothing can sort
+    before them, which covers lines whose keys tie or differ only past the
+    prefix; memory stays bounded by the number of such lines.
+    """
+
+    def __init__(self, ofp):
+        self.ofp = ofp
+        self.heap = []
+
+    def write(self, line, prefix):
+        bound = sort_key(prefix)[0]
+        while self.heap and self.heap[0][0][0] < bound:
+            self.ofp.write(heapq.heappop(self.heap)[1] + "\n")
+        heapq.heappush(self.heap, (sort_key(line), line))
+
+    def flush(self):
+        while self.heap:
+            self.ofp.write(heapq.heappop(self.heap)[1] + "\n")
@@ -0,0 +1,179 @@
+"""per-stage timings and counters for a run, reported as JSON"""
+
+import heapq
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from .hash import HashDigest, dot_path
+from .version import __version__
+
+# files listed in the report's slowest entry
+DEFAULT_SLOWEST = 10
+
+
+class TimedDigests(tuple):
+    """digests of a file, carrying the seconds taken to open, read and hash it"""
+
+    seconds = None
+
+    def take_seconds(self):
+        """return the seconds once; hard links that share these digests report none"""
+        seconds, self.seconds = self.seconds, None
+        return seconds
+
+
+class TimedHashDigest(HashDigest):
+    """a HashDigest whose results record how long each file took, even in a worker process"""
+
+    def cached_digest(self, item):
+        filename, digests = item
+        if digests is not None:
+            return digests
+        start = time.perf_counter()
+        digests = TimedDigests(self.digests(filename))
+        digests.seconds = time.perf_counter() - start
+        return digests
+
+
+def _bucket(size):
+    """return the power of two a file size rounds up to, 0 for an empty file"""
+    return 0 if size == 0 else 1 << (size - 1).bit_length()
+
+
+class RunStats:
+    """accumulate stage timings, file counters, a size histogram and the slowest files of a run
+
+    Stages are wall-clock seconds and do not overlap on a thread: time
+    spent in a stage timed within another, such as the walk feeding the
+    wait for hash results, counts only toward the inner one, so the hash
+    stage and the throughput over it cover hashing alone. A walk or list
+    produced by a streaming thread runs alongside the hash stage instead.
+    File seconds are measured where each file is hashed, so with jobs they
+    overlap and may add up to more than the hash stage; files hashed by the
+    asyncio engine are not timed one by one.
+    """
+
+    def __init__(self, slowest=None):
+        self.started = time.perf_counter()
+        self.stages = defaultdict(float)
+        self.files = 0
+        self.bytes = 0
+        self.hits = 0
+        self.hashed = 0
+        self.timed = 0
+        self.timed_bytes = 0
+        self.file_seconds = 0.0
+        self.sizes = defaultdict(int)
+        self.slowest = []
+        self.count = DEFAULT_SLOWEST if slowest is None else slowest
+        # seconds charged to stages on each thread, to take nested stages out of the one around them
+        self._local = threading.local()
+
+    def _start(self):
+        return time.perf_counter(), getattr(self._local, "charged", 0.0)
+
+    def _stop(self, name, started):
+        """charge the seconds since started to stage name, less those charged to stages within it"""
+        start, charged = started
+        seconds = time.perf_counter() - start
+        self.stages[name] += seconds - (getattr(self._local, "charged", 0.0) - charged)
+        self._local.charged = charged + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = self._start()
+        try:
+            yield
+        finally:
+            self._stop(name, started)
+
+    def timed_iter(self, name, iterable):
+        """yield from iterable, adding the time spent producing each item to stage name"""
+        items = iter(iterable)
+        while True:
+            started = self._start()
+            try:
+                item = next(items)
+            except StopIteration:
+                self._stop(name, started)
+                return
+            self._stop(name, started)
+            yield item
+
+    def counted(self, results):
+        """yield (filename, stat, digests) results, timed as the hash stage, adding each file
+
+        The time the caller takes over each result is the write stage.
+        """
+        for result in self.timed_iter("hash", results):
+            self.add(*result)
+            started = self._start()
+            yield result
+            self._stop("write", started)
+
+    def add(self, filename, stat, digests):
+        self.files += 1
+        self.bytes += stat.st_size
+        self.sizes[_bucket(stat.st_size)] += 1
+        seconds = digests.take_seconds() if isinstance(digests, TimedDigests) else None
+        if seconds is None:
+            return
+        self.timed += 1
+        self.timed_bytes += stat.st_size
+        self.file_seconds += seconds
+        if len(self.slowest) < self.count:
+            heapq.heappush(self.slowest, (seconds, dot_path(filename), stat.st_size))
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, dot_path(filename), stat.st_size))
+
+    def add_cache(self, cache):
+        self.hits += cache.hits
+        self.hashed += cache.hashed
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        hash_seconds = self.stages.get("hash", 0.0)
+        return dict(
+            version=__version__,
+            elapsed=elapsed,
+            stages=dict(self.stages),
+            files=self.files,
+            bytes=self.bytes,
+            cached=self.hits,
+            hashed=self.hashed,
+            mb_per_second=_rate(self.bytes, hash_seconds),
+            file_seconds=self.file_seconds,
+            file_mb_per_second=_rate(self.timed_bytes, self.file_seconds),
+            slowest=[
+                dict(path=path, size=size, seconds=seconds)
+                for seconds, path, size in sorted(self.slowest, reverse=True)
+            ],
+            sizes={str(size): count for size, count in sorted(self.sizes.items())},
+        )
+
+    def write(self, filename):
+        """write the report to filename, or to stderr for '-' so it does not mix with a listing on stdout"""
+        report = json.dumps(self.report(), indent=2) + "\n"
+        if filename in ("-", None):
+            sys.stderr.write(report)
+        else:
+            Path(filename).write_text(report)
+
+
+def stage(stats, name):
+    """return a context timing stage name of stats, a RunStats or None"""
+    return nullcontext() if stats is None else stats.stage(name)
+
+
+def timed(stats, name, iterable):
+    """return iterable, timed as stage name of stats unless stats is None"""
+    return iterable if stats is None else stats.timed_iter(name, iterable)
+
+
+def _rate(size, seconds):
+    return size / 1e6 / seconds if seconds else None
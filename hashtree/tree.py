@@ -0,0 +1,61 @@
+"""Merkle-style digests of directories"""
+
+import hashlib
+from collections import defaultdict
+
+from .hash import DEFAULT_HASH, dot_path, format_digest_line
+from .sort import sort_key
+
+
+class MerkleTree:
+    """combine file digests into a digest for every directory and the root
+
+    A directory's digest hashes its children sorted by name, each as
+    '<type> <name>\\0' followed by the child's raw digest, where type is 'd'
+    or 'f'. Two trees with the same root digest have the same names and
+    contents; where they differ, only subtrees with differing digests need
+    to be compared. Directories containing no listed files do not appear,
+    except the root, which is always given; with no files it is the digest
+    of no children.
+    """
+
+    def __init__(self, hash=None):
+        if hash is None:
+            hash = DEFAULT_HASH
+        self._hash = getattr(hashlib, hash.lower())
+        self.hash = hash.upper()
+        self.children = defaultdict(list)
+
+    def add(self, filename, digest):
+        parent, _, name = dot_path(filename).rpartition("/")
+        self.children[parent].append((name, "f", bytes.fromhex(digest)))
+
+    def digests(self):
+        """return (path, hexdigest) for every directory in sort order, the root being './'"""
+
+        children = defaultdict(list, {path: list(entries) for path, entries in self.children.items()})
+        dirs = {"."}
+        for path in list(children):
+            while path not in dirs:
+                dirs.add(path)
+                if path == ".":
+                    break
+                path = path.rpartition("/")[0]
+
+        results = []
+        for path in sorted(dirs, key=lambda path: path.count("/"), reverse=True):
+            hasher = self._hash()
+            for name, kind, digest in sorted(children.pop(path, [])):
+                hasher.update(f"{kind} {name}\0".encode("utf-8", "surrogateescape"))
+                hasher.update(digest)
+            digest = hasher.digest()
+            results.append((path + "/", digest.hex()))
+            if path != ".":
+                parent, _, name = path.rpartition("/")
+                children[parent].append((name, "d", digest))
+
+        return sorted(results, key=lambda result: sort_key(result[0]))
+
+    def lines(self):
+        """return a listing line for every directory"""
+        return [format_digest_line(self.hash, path, digest) for path, digest in self.digests()]
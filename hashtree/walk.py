@@ -0,0 +1,68 @@
+"""in-process replacement for 'find . -type f'"""
+
+import heapq
+import os
+from pathlib import Path
+
+from .sort import sort_key
+
+
+def _scandir(base, path):
+    try:
+        with os.scandir(Path(base, path)) as entries:
+            yield from entries
+    except (FileNotFoundError, NotADirectoryError):
+        # removed or replaced after it was listed
+        return
+
+
+def walk_files(base, sort=True):
+    """yield (path, DirEntry) for each regular file below base
+
+    Paths are relative to base and formatted as 'find . -type f' prints them.
+    Symbolic links are not followed. Unsorted, files are yielded in directory
+    order, depth first, as find lists them.
+
+    Sorted, files are yielded in the order 'sort -ifdk1.1' would put the
+    list in. Directories are kept on a heap with the files and expanded only
+    when they reach the top; every path below a directory has a sort key
+    greater than the directory's own, so nothing sorts ahead of an
+    unexpanded directory and the list never has to be held in memory.
+    """
+
+    if not sort:
+        yield from _walk(base)
+        return
+
+    heap = []
+    for entry in _scandir(base, "."):
+        _push(heap, ".", entry)
+
+    while heap:
+        _, path, entry = heapq.heappop(heap)
+        if entry.is_dir(follow_symlinks=False):
+            for child in _scandir(base, path):
+                _push(heap, path, child)
+        else:
+            yield path, entry
+
+
+def _push(heap, parent, entry):
+    if entry.is_dir(follow_symlinks=False) or entry.is_file(follow_symlinks=False):
+        path = f"{parent}/{entry.name}"
+        heapq.heappush(heap, (sort_key(path), path, entry))
+
+
+def _walk(base):
+    stack = [(".", _scandir(base, "."))]
+    while stack:
+        parent, entries = stack[-1]
+        for entry in entries:
+            path = f"{parent}/{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((path, _scandir(base, path)))
+                break
+            elif entry.is_file(follow_symlinks=False):
+                yield path, entry
+        else:
+            stack.pop()
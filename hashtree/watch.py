@@ -0,0 +1,297 @@
+"""keep a digest listing current while files below the base directory change"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from .pool import ordered_map
+from .sort import sort_key
+from .walk import walk_files
+
+DEFAULT_WATCH_INTERVAL = 5.0
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# content changes are seen when the writer closes the file, not on every write
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+)
+
+EVENT = struct.Struct("iIII")
+
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+def _file_digests(hasher, filename):
+    try:
+        return hasher.digests(filename)
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        # removed or replaced while waiting to be hashed; a later event or scan catches up
+        return None
+
+
+def _under(path, directory):
+    return directory == "." or path.startswith(directory + "/")
+
+
+class DigestIndex:
+    """digests of the regular files below base, updated for the paths given to refresh()"""
+
+    def __init__(self, base, hasher, jobs=1, executor=None):
+        self.base = Path(base)
+        self.hasher = hasher
+        self.jobs = jobs
+        self.executor = executor
+        self.entries = {}
+        self.changed = False
+
+    def scan(self, directory="."):
+        """re-examine every file below directory, dropping entries for files no longer there"""
+        found = [directory + path[1:] for path, _ in walk_files(self.base / directory, sort=False)]
+        present = set(found)
+        for path in [path for path in self.entries if _under(path, directory) and path not in present]:
+            del self.entries[path]
+            self.changed = True
+        self.refresh(found)
+
+    def refresh(self, paths):
+        """rehash the files among paths whose size, mtime or inode changed; drop those that are gone"""
+        pending = []
+        for path in paths:
+            signature = self._examine(path)
+            if signature is not None:
+                pending.append((path, signature))
+
+        digests = ordered_map(
+            partial(_file_digests, self.hasher), [path for path, _ in pending], self.jobs, self.executor
+        )
+        for (path, signature), result in zip(pending, digests):
+            if result is None:
+                self.entries.pop(path, None)
+            else:
+                self.entries[path] = (signature, result)
+            self.changed = True
+
+    def _examine(self, path):
+        """return the signature of path if it is a file to rehash; rescan a directory, drop anything gone"""
+        try:
+            st = os.lstat(self.base / path)
+        except (FileNotFoundError, NotADirectoryError):
+            st = None
+        if st is not None and stat.S_ISDIR(st.st_mode):
+            self.scan(path)
+            return None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            if self.entries.pop(path, None) is not None:
+                self.changed = True
+            elif st is None:
+                # a directory that was removed or moved away
+                self._drop(path)
+            return None
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        entry = self.entries.get(path)
+        return signature if entry is None or entry[0] != signature else None
+
+    def _drop(self, directory):
+        for path in [path for path in self.entries if path.startswith(directory + "/")]:
+            del self.entries[path]
+            self.changed = True
+
+    def lines(self):
+        """return the listing lines for every file, in sort order"""
+        return [self.hasher.format(path, self.entries[path][1]) for path in sorted(self.entries, key=sort_key)]
+
+
+class PollWatcher:
+    """report that everything may have changed once per interval"""
+
+    def __init__(self, base):
+        self.base = Path(base)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def add_tree(self, directory="."):
+        pass
+
+    def wait(self, timeout, stop):
+        """return the paths that may have changed within timeout, or None to rescan everything"""
+        stop.wait(timeout)
+        return None
+
+
+class InotifyWatcher(PollWatcher):
+    """report the paths inotify saw change, watching every directory below base
+
+    If a directory cannot be watched, most often because the tree has more
+    directories than fs.inotify.max_user_watches allows, events would miss
+    part of it; from then on every wait asks for a full rescan instead.
+    """
+
+    def __init__(self, base):
+        super().__init__(base)
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._init = libc.inotify_init1
+        self.fd = None
+        self.dirs = {}
+        self.polling = False
+
+    @classmethod
+    def available(cls):
+        if not sys.platform.startswith("linux"):
+            return False
+        path = ctypes.util.find_library("c")
+        return path is not None and hasattr(ctypes.CDLL(path), "inotify_init1")
+
+    def __enter__(self):
+        fd = self._init(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.fd = fd
+        return self
+
+    def __exit__(self, *args):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        return False
+
+    def add_tree(self, directory="."):
+        """watch directory and every directory below it"""
+        stack = [directory]
+        while stack:
+            path = stack.pop()
+            wd = self._add_watch(self.fd, os.fsencode(self.base / path), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                    # removed before it could be watched, or not a directory any more
+                    continue
+                self.polling = True
+                return
+            self.dirs[wd] = path
+            try:
+                with os.scandir(self.base / path) as entries:
+                    stack.extend(f"{path}/{entry.name}" for entry in entries if entry.is_dir(follow_symlinks=False))
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+
+    def wait(self, timeout, stop):
+        if self.polling:
+            return super().wait(timeout, stop)
+        deadline = time.monotonic() + timeout
+        paths = set()
+        while not stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([self.fd], [], [], min(remaining, 0.5))
+            if not readable:
+                continue
+            for wd, mask, name in self._read():
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                directory = self.dirs.get(wd)
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                if directory is None:
+                    continue
+                path = f"{directory}/{name}" if name else directory
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # a directory moved within the tree keeps its watch, now under the new name
+                    self.add_tree(path)
+                paths.add(path)
+        return paths
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            end = offset + length
+            name = data[offset:end].rstrip(b"\0")
+            offset = end
+            yield wd, mask, os.fsdecode(name)
+
+
+def replace_listing(filename, lines):
+    """write lines to a temp file beside filename, then rename it over filename"""
+    with tempfile.NamedTemporaryFile("w", dir=Path(filename).parent, prefix=".hashtree", delete=False) as ofp:
+        ofp.writelines(line + "\n" for line in lines)
+    os.replace(ofp.name, filename)
+
+
+def watch_tree(base, hasher, flush, interval=None, jobs=1, executor=None, stop=None, poll=False):
+    """hash every file below base, then keep calling flush(lines) with a current listing as files change
+
+    Directories are watched with inotify where it is available, so only the
+    files named in events are re-examined; otherwise, or with poll, the tree
+    is rescanned each interval and only files whose size, mtime or inode
+    changed are hashed again. flush is called at most once per interval and
+    only when something changed. Runs until stop is set.
+    """
+
+    if interval is None:
+        interval = DEFAULT_WATCH_INTERVAL
+    if stop is None:
+        stop = threading.Event()
+
+    index = DigestIndex(base, hasher, jobs, executor)
+    watcher = PollWatcher(base) if poll or not InotifyWatcher.available() else InotifyWatcher(base)
+    with watcher:
+        # watch before the first pass so changes made during it are not missed
+        watcher.add_tree()
+        index.scan()
+        flush(index.lines())
+        index.changed = False
+        while not stop.is_set():
+            paths = watcher.wait(interval, stop)
+            if paths is None:
+                index.scan()
+            else:
+                index.refresh(sorted(paths))
+            if index.changed:
+                flush(index.lines())
+                index.changed = False
+    return index
@@ -23,3 +23,22 @@ def validate_hash_file(validate_hash_line):
                 assert validate_hash_line(hash, line)
 
     return _validate_hash_file
+
+
+@pytest.fixture
+def write_tree(tmp_path):
+    """return a function writing a tree below tmp_path from a mapping of relative path to text or bytes"""
+
+    def _write_tree(contents, name="tree"):
+        root = tmp_path / name
+        root.mkdir(parents=True, exist_ok=True)
+        for path, data in contents.items():
+            path = root / path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(data, bytes):
+                path.write_bytes(data)
+            else:
+                path.write_text(data)
+        return root
+
+    return _write_tree
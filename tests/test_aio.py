@@ -0,0 +1,48 @@
+# asyncio engine tests
+
+import pytest
+
+from hashtree import hashtree
+from hashtree.aio import async_ordered_map
+from hashtree.hash import HashDigest
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({f"d{index % 3}/f{index}": bytes(range(256)) * index for index in range(50)})
+
+
+@pytest.mark.parametrize("jobs, concurrency", [(1, 1), (2, 8), (0, 64)])
+def test_async_ordered_map(tree, jobs, concurrency):
+    hasher = HashDigest(tree, ["sha256", "md5"], block_size=1000)
+    files = sorted(str(path.relative_to(tree)) for path in tree.rglob("f*"))
+    items = [(filename, ("cached",) if index % 5 == 0 else None) for index, filename in enumerate(files)]
+    expected = [digests or hasher.digests(filename) for filename, digests in items]
+    assert list(async_ordered_map(hasher, items, jobs, concurrency)) == expected
+
+
+def test_async_ordered_map_missing(tree):
+    hasher = HashDigest(tree)
+    with pytest.raises(FileNotFoundError):
+        list(async_ordered_map(hasher, [("d0/f0", None), ("missing", None)], 2, 4))
+
+
+def test_async_ordered_map_close(tree):
+    hasher = HashDigest(tree)
+    results = async_ordered_map(hasher, ((f"d{n % 3}/f{n}", None) for n in range(50)), 2, 4)
+    assert next(results) == hasher.digests("d0/f0")
+    results.close()
+
+
+def test_asyncio_engine_output(tree, tmp_path):
+    pool = tmp_path / "pool"
+    aio = tmp_path / "aio"
+    hashtree(tree, None, pool)
+    hashtree(tree, None, aio, engine="asyncio", concurrency=16, jobs=2)
+    assert aio.read_text() == pool.read_text()
+
+
+@pytest.mark.parametrize("option", [dict(io="mmap"), dict(executor="process")])
+def test_asyncio_engine_rejects_io_and_executor(tree, tmp_path, option):
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, tmp_path / "sums", engine="asyncio", **option)
@@ -0,0 +1,53 @@
+# library api tests
+
+import subprocess
+
+import pytest
+
+from hashtree import DigestRecord, hashtree, iter_digests
+from hashtree.hash import HashDigest
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name * 10 for name in ["b", "a/c", "a/D"]})
+
+
+def test_iter_digests(tree, tmp_path):
+    records = list(iter_digests(tree))
+    assert all(isinstance(record, DigestRecord) for record in records)
+    assert [record.path for record in records] == ["./a/c", "./a/D", "./b"]
+    hasher = HashDigest(tree)
+    for record in records:
+        stat = (tree / record.path).stat()
+        assert (record.size, record.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+        assert record.digests == (bytes.fromhex(hasher.digest(record.path)),)
+
+    hashtree(tree, None, tmp_path / "sums")
+    lines = [f"SHA256 ({record.path}) = {record.digests[0].hex()}" for record in records]
+    assert (tmp_path / "sums").read_text().splitlines() == lines
+
+
+def test_iter_digests_paths(tree):
+    paths = ["b", str(tree / "a/c"), "./a/D"]
+    records = list(iter_digests(tree, paths, hash=["md5", "sha1"], jobs=2))
+    assert [record.path for record in records] == ["./b", "./a/c", "./a/D"]
+    assert [len(digest) for digest in records[0].digests] == [16, 20]
+
+
+def test_iter_digests_no_spool(tree, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def no_subprocess(*args, **kwargs):
+        raise AssertionError("subprocess started")
+
+    monkeypatch.setattr(subprocess, "Popen", no_subprocess)
+    before = set(tmp_path.rglob("*"))
+    assert len(list(iter_digests(tree, sort=False))) == 3
+    assert set(tmp_path.rglob("*")) == before
+
+
+def test_iter_digests_cache(tree, tmp_path):
+    cache = tmp_path / "cache.db"
+    first = list(iter_digests(tree, cache=cache))
+    assert list(iter_digests(tree, cache=cache)) == first
@@ -0,0 +1,50 @@
+# benchmark tests
+
+import json
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from hashtree.bench import SHAPES, bench, make_tree, parse_shape
+
+
+def test_parse_shape():
+    assert parse_shape("tiny") == SHAPES["tiny"]
+    assert parse_shape("10x4096") == (10, 4096)
+    with pytest.raises(click.BadParameter):
+        parse_shape("huge")
+
+
+def test_make_tree(tmp_path):
+    make_tree(tmp_path, 1005, 10)
+    files = sorted(path for path in tmp_path.rglob("*") if path.is_file())
+    assert len(files) == 1005
+    assert {path.parent.name for path in files} == {"d0000", "d0001"}
+    assert all(path.stat().st_size == 10 for path in files)
+
+
+def test_bench_json(tmp_path):
+    output = tmp_path / "bench.json"
+    cmd = ["-s", "3x1000", "-h", "md5", "-i", "read", "-i", "mmap", "-j", "1", "-d", str(tmp_path), "-o", str(output)]
+    result = CliRunner().invoke(bench, cmd)
+    assert result.exit_code == 0, result.output
+    report = json.loads(output.read_text())
+    assert [(r["io"], r["files"], r["bytes"]) for r in report["results"]] == [("read", 3, 3000), ("mmap", 3, 3000)]
+    for key in ["seconds", "mb_per_s", "files_per_s", "peak_rss"]:
+        assert report["results"][0][key] > 0
+
+
+def test_bench_file_list(tmp_path):
+    output = tmp_path / "bench.json"
+    cmd = ["-s", "1x10", "-h", "md5", "-i", "read", "-j", "1", "-l", "1000", "-d", str(tmp_path), "-o", str(output)]
+    result = CliRunner().invoke(bench, cmd)
+    assert result.exit_code == 0, result.output
+    readers = json.loads(output.read_text())["readers"]
+    assert [(r["separator"], r["progress"]) for r in readers] == [
+        ("newline", False),
+        ("newline", True),
+        ("nul", False),
+        ("nul", True),
+    ]
+    assert all(r["lines_per_s"] > 0 for r in readers)
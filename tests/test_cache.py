@@ -0,0 +1,119 @@
+# digest cache tests
+
+import os
+
+import pytest
+
+from hashtree import hashtree
+from hashtree.cache import DigestCache
+from hashtree.hash import HashDigest
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name * 100 for name in ["a", "b", "c"]})
+
+
+def test_cache_reuse(tree, shared_datadir):
+    cache = shared_datadir / "cache.db"
+    first = shared_datadir / "first"
+    second = shared_datadir / "second"
+
+    hashtree(tree, None, first, cache=cache)
+    with DigestCache(cache, tree) as digest_cache:
+        hasher = HashDigest(tree)
+        files = [("./a", None), ("./b", None), ("./c", None)]
+        lines = [hasher.format(f, digests) for f, _, digests in digest_cache.file_digests(hasher, files)]
+        assert (digest_cache.hits, digest_cache.misses) == (3, 0)
+    assert "\n".join(lines) + "\n" == first.read_text()
+
+    # a modified file must be rehashed even if the cached digest is still present
+    (tree / "b").write_text("changed")
+    hashtree(tree, None, second, cache=cache)
+    with DigestCache(cache, tree) as digest_cache:
+        list(digest_cache.file_digests(HashDigest(tree), [("./a", None), ("./b", None), ("./c", None)]))
+        assert (digest_cache.hits, digest_cache.misses) == (3, 0)
+    assert second.read_text() != first.read_text()
+    assert second.read_text().split("\n")[0] == first.read_text().split("\n")[0]
+
+
+def test_cache_poisoned_entry_ignored(tree, shared_datadir):
+    cache = shared_datadir / "cache.db"
+    hashtree(tree, None, shared_datadir / "sums", cache=cache)
+    with DigestCache(cache, tree) as digest_cache:
+        digest_cache.db.execute("UPDATE digests SET digest='bogus', mtime_ns=0")
+    hashtree(tree, None, shared_datadir / "sums2", cache=cache)
+    assert "bogus" not in (shared_datadir / "sums2").read_text()
+
+
+def test_cache_prune(tree, shared_datadir):
+    cache = shared_datadir / "cache.db"
+    hashtree(tree, None, os.devnull, cache=cache)
+    (tree / "c").unlink()
+    hashtree(tree, None, os.devnull, cache=cache)
+    with DigestCache(cache, tree) as digest_cache:
+        paths = [path for (path,) in digest_cache.db.execute("SELECT path FROM digests")]
+    assert sorted(os.path.basename(path) for path in paths) == ["a", "b"]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_hard_links_hashed_once(write_tree, tmp_path, monkeypatch, jobs):
+    tree = write_tree({"daily.0/shared": "shared", "daily.0/own": "own", "daily.2/own": "other"})
+    (tree / "daily.1").mkdir()
+    os.link(tree / "daily.0/shared", tree / "daily.1/shared")
+    os.link(tree / "daily.0/shared", tree / "daily.2/renamed")
+
+    hashed = []
+    digests = HashDigest.digests
+
+    def counting(self, filename):
+        hashed.append(str(filename))
+        return digests(self, filename)
+
+    monkeypatch.setattr(HashDigest, "digests", counting)
+    hashtree(tree, None, tmp_path / "linked", jobs=jobs)
+    assert sorted(hashed) == ["./daily.0/own", "./daily.0/shared", "./daily.2/own"]
+
+    hashtree(tree, None, tmp_path / "unlinked", links=False)
+    assert (tmp_path / "linked").read_text() == (tmp_path / "unlinked").read_text()
+    assert len((tmp_path / "linked").read_text().splitlines()) == 5
+
+
+def test_journal_resume(tree, tmp_path, monkeypatch):
+    (tree / "d").write_text("d" * 100)
+    journal = tmp_path / "journal"
+    hashtree(tree, None, tmp_path / "full", hash=["sha256", "md5"], journal=journal)
+    lines = journal.read_text().splitlines()
+    assert len(lines) == 8
+    assert lines[0].startswith("100 ")
+
+    # interrupted after a and b, midway through writing c; b changed since
+    journal.write_text("\n".join(lines[:4]) + "\n" + lines[4][:20])
+    (tree / "b").write_text("changed")
+
+    hashed = []
+    digests = HashDigest.digests
+
+    def counting(self, filename):
+        hashed.append(str(filename))
+        return digests(self, filename)
+
+    monkeypatch.setattr(HashDigest, "digests", counting)
+    hashtree(tree, None, tmp_path / "resumed", hash=["sha256", "md5"], journal=journal, resume=True)
+    assert sorted(hashed) == ["./b", "./c", "./d"]
+
+    hashtree(tree, None, tmp_path / "fresh", hash=["sha256", "md5"])
+    assert (tmp_path / "resumed").read_text() == (tmp_path / "fresh").read_text()
+    assert (tmp_path / "resumed").read_text() != (tmp_path / "full").read_text()
+    # the torn line is dropped, and the journal now holds every file
+    resumed = journal.read_text().splitlines()
+    assert resumed[:4] == lines[:4]
+    assert len(resumed) == 10
+    assert all(line.split(" ", 2)[2] in (tmp_path / "fresh").read_text() for line in resumed[4:])
+
+
+def test_journal_requires_exclusive_cache(tree, tmp_path):
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, os.devnull, resume=True)
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, os.devnull, journal=tmp_path / "journal", cache=tmp_path / "cache.db")
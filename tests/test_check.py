@@ -0,0 +1,96 @@
+# digest verification tests
+
+from collections import Counter
+
+import pytest
+from click.testing import CliRunner
+
+from hashtree import check_tree, cli, hashtree
+from hashtree.check import FAILED, MISSING, OK, UNREADABLE, parse_digest_line
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name for name in ["a", "b", "c (1)", "d/e"]})
+
+
+@pytest.fixture
+def digests(tree, tmp_path):
+    path = tmp_path / "digests"
+    hashtree(tree, None, path)
+    return path
+
+
+def statuses(report):
+    return Counter(line.rsplit(": ", 1)[1] for line in report.read_text().splitlines())
+
+
+def test_parse_digest_line():
+    assert parse_digest_line("SHA256 (./x (1)) = ABCD\n") == ("sha256", "./x (1)", "abcd")
+    assert parse_digest_line("BLAKE2B (./x) = 00") == ("blake2b", "./x", "00")
+    assert parse_digest_line("NOPE (./x) = 00") is None
+    assert parse_digest_line("garbage") is None
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_check_ok(tree, digests, tmp_path, jobs):
+    report = tmp_path / "report"
+    assert check_tree(tree, report, check=digests, jobs=jobs) == 0
+    assert statuses(report) == {OK: 4}
+    assert report.read_text().splitlines()[0] == "./a: OK"
+
+
+def test_check_mixed_algorithms(tree, digests, tmp_path, capsys):
+    hashtree(tree, None, tmp_path / "md5", hash="md5")
+    mixed = tmp_path / "mixed"
+    mixed.write_text(digests.read_text() + "\n" + (tmp_path / "md5").read_text() + "not a digest line\n")
+    assert check_tree(tree, tmp_path / "report", check=mixed) == 0
+    assert statuses(tmp_path / "report") == {OK: 8}
+    assert "1 line(s) improperly formatted" in capsys.readouterr().err
+
+
+def test_check_failures(tree, digests, tmp_path):
+    (tree / "b").write_text("changed")
+    (tree / "d" / "e").unlink()
+    report = tmp_path / "report"
+    assert check_tree(tree, report, check=digests, jobs=2) == 1
+    assert statuses(report) == {OK: 2, FAILED: 1, MISSING: 1}
+    assert "./b: FAILED" in report.read_text().splitlines()
+    assert "./d/e: MISSING" in report.read_text().splitlines()
+
+    assert check_tree(tree, report, check=digests, fail_fast=True) == 1
+    assert statuses(report) == {OK: 1, FAILED: 1}
+
+
+def test_check_unreadable(tree, digests, tmp_path):
+    listing = tmp_path / "listing"
+    listing.write_text("SHA256 (./d) = 00\n" + digests.read_text())
+    report = tmp_path / "report"
+    assert check_tree(tree, report, check=listing) == 1
+    assert statuses(report) == {OK: 4, UNREADABLE: 1}
+    assert report.read_text().splitlines()[0] == "./d: FAILED open or read"
+
+    result = CliRunner().invoke(cli, ["-b", str(tree), "--check", str(listing)])
+    assert result.exit_code == 1
+    assert "1 listed file(s) could not be read" in result.output
+
+
+def test_check_exit_code(tree, digests):
+    runner = CliRunner()
+    result = runner.invoke(cli, ["-b", str(tree), "--check", str(digests)])
+    assert result.exit_code == 0
+    (tree / "a").write_text("changed")
+    result = runner.invoke(cli, ["-b", str(tree), "--check", str(digests)])
+    assert result.exit_code == 1
+    assert "did NOT match" in result.output
+
+
+def test_check_report_as_only_argument(tree, digests, tmp_path):
+    report = tmp_path / "report"
+    result = CliRunner().invoke(cli, ["-b", str(tree), "--check", str(digests), str(report)])
+    assert result.exit_code == 0, result.output
+    assert statuses(report) == {OK: 4}
+
+    result = CliRunner().invoke(cli, ["-b", str(tree), "--check", str(digests), str(digests), str(report)])
+    assert result.exit_code == 2
+    assert "INFILE cannot be used with --check" in result.output
@@ -0,0 +1,72 @@
+# duplicate detection tests
+
+import pytest
+from click.testing import CliRunner
+
+from hashtree import cli, dupes, list_duplicates
+from hashtree.dupes import find_duplicates
+from hashtree.hash import HashDigest
+from hashtree.walk import walk_files
+
+SAMPLE = 16
+
+
+@pytest.fixture
+def tree(write_tree):
+    head, middle, tail = b"h" * SAMPLE, b"m" * SAMPLE, b"t" * SAMPLE
+    contents = {
+        "unique": b"only one of this size",
+        "small/a": b"abc",
+        "small/B": b"abc",
+        "small/c": b"abd",
+        "empty1": b"",
+        "empty2": b"",
+        # same size and same ends, differing only in the middle
+        "large/x": head + middle + tail,
+        "large/y": head + b"M" * SAMPLE + tail,
+        "large/z": head + middle + tail,
+        # same size, different ends
+        "large/w": tail + middle + head,
+    }
+    return write_tree(contents)
+
+
+def test_find_duplicates(tree, monkeypatch):
+    hashed = []
+    full_digests = dupes._full_digests
+
+    def counting(hasher, filename):
+        hashed.append(filename)
+        return full_digests(hasher, filename)
+
+    monkeypatch.setattr(dupes, "_full_digests", counting)
+    hasher = HashDigest(tree)
+    groups = find_duplicates(tree, hasher, walk_files(tree), sample_size=SAMPLE)
+    assert [paths for _, paths in groups] == [
+        ["./empty1", "./empty2"],
+        ["./large/x", "./large/z"],
+        ["./small/a", "./small/B"],
+    ]
+    assert groups[1][0] == hasher.digests("large/x")
+    # unique sizes and the bucket member with different ends are never hashed in full
+    assert sorted(hashed) == sorted(
+        ["./empty1", "./empty2", "./large/x", "./large/y", "./large/z", "./small/a", "./small/B", "./small/c"]
+    )
+
+
+def test_duplicates_output(tree, tmp_path):
+    output = tmp_path / "dupes"
+    assert list_duplicates(tree, None, output, jobs=2) == 0
+    blocks = output.read_text().split("\n\n")
+    assert len(blocks) == 3
+    assert blocks[2].splitlines() == [
+        HashDigest(tree).file_digest("small/a"),
+        HashDigest(tree).file_digest("small/B"),
+    ]
+
+
+@pytest.mark.parametrize("option", [["--format", "gnu"], ["--sort-output"], ["--tree", "tree.sums"], ["--stats"]])
+def test_duplicates_rejects_hashing_options(tree, option):
+    result = CliRunner().invoke(cli, ["-b", str(tree), "--duplicates", *option])
+    assert result.exit_code == 2
+    assert f"{option[0]} cannot be used with --duplicates" in result.output
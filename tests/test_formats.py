@@ -0,0 +1,83 @@
+# output format tests
+
+import io
+import json
+import subprocess
+
+import pytest
+
+from hashtree import BinaryReader, hashtree, read_binary
+from hashtree.formats import GNUWriter
+from hashtree.hash import HashDigest
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name * 100 for name in ["a", "b/c", "b/d é"]})
+
+
+def test_gnu(tree, tmp_path):
+    output = tmp_path / "sums"
+    hashtree(tree, None, output, format="gnu")
+    lines = output.read_text().splitlines()
+    assert lines[0] == HashDigest(tree).digest("a") + "  ./a"
+    # sha256sum verifies the listing
+    subprocess.run(["sha256sum", "--check", "--quiet", str(output)], cwd=tree, check=True)
+
+
+def test_gnu_rejects_several_hashes(tree, tmp_path):
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, tmp_path / "sums", format="gnu", hash=["sha256", "md5"])
+    assert not (tmp_path / "sums").exists()
+
+
+def test_gnu_escape():
+    ofp = io.StringIO()
+    GNUWriter(ofp, ["MD5"]).write("a\\b\nc", None, ("00",))
+    assert ofp.getvalue() == "\\00  ./a\\\\b\\nc\n"
+
+
+def test_jsonl(tree, tmp_path):
+    output = tmp_path / "sums"
+    hashtree(tree, None, output, format="jsonl", hash=["sha256", "md5"])
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["path"] for record in records] == ["./a", "./b/c", "./b/d é"]
+    stat = (tree / "b/c").stat()
+    hasher = HashDigest(tree, ["sha256", "md5"])
+    digests = dict(zip(["sha256", "md5"], hasher.digests("b/c")))
+    assert records[1] == dict(path="./b/c", size=stat.st_size, mtime_ns=stat.st_mtime_ns, **digests)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_binary(tree, tmp_path, jobs):
+    output = tmp_path / "sums"
+    hashtree(tree, None, output, format="binary", hash=["sha256", "md5"], jobs=jobs)
+    with output.open("rb") as ifp:
+        reader = BinaryReader(ifp)
+        assert reader.hashes == ["SHA256", "MD5"]
+        assert reader.sizes == [32, 16]
+        records = list(reader)
+    hasher = HashDigest(tree, ["sha256", "md5"])
+    assert [record.path for record in records] == ["./a", "./b/c", "./b/d é"]
+    for record in records:
+        stat = (tree / record.path).stat()
+        assert (record.size, record.mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+        assert tuple(digest.hex() for digest in record.digests) == hasher.digests(record.path)
+    assert list(read_binary(output)) == records
+    hashtree(tree, None, tmp_path / "bsd", hash=["sha256", "md5"])
+    assert output.stat().st_size < (tmp_path / "bsd").stat().st_size
+
+
+def test_binary_errors(write_tree, tmp_path):
+    with pytest.raises(ValueError):
+        BinaryReader(io.BytesIO(b"not a listing"))
+    output = tmp_path / "sums"
+    hashtree(write_tree({"a": "a"}), None, output, format="binary")
+    data = output.read_bytes()
+    with pytest.raises(ValueError):
+        list(BinaryReader(io.BytesIO(data[:-1])))
+
+
+def test_format_requires_bsd(tree, tmp_path):
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, tmp_path / "sums", format="jsonl", sort_output=True)
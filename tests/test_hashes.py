@@ -1,9 +1,13 @@
 # test all hash types
 
+import hashlib
+import pickle
 from pathlib import Path
 
+import pytest
+
 from hashtree import hashtree
-from hashtree.hash import HASHES
+from hashtree.hash import HASHES, IO_MODES, HashDigest
 
 
 def test_hashes_list(shared_datadir, validate_hash_file):
@@ -13,3 +17,90 @@ def test_hashes_list(shared_datadir, validate_hash_file):
         validate_hash_file(hash, output)
         sums = Path("./tests/data") / output.name
         sums.write_text(output.read_text())
+
+
+def test_block_size_digest(shared_datadir):
+    data = bytes(range(256)) * 1000
+    (shared_datadir / "blocks").write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    for block_size in [1, 255, 4096, len(data), len(data) * 2]:
+        hasher = HashDigest(shared_datadir, "sha256", block_size)
+        assert hasher.digest("blocks") == expected
+        assert hasher.file_digest("blocks") == f"SHA256 (./blocks) = {expected}"
+
+
+def test_block_size_invalid():
+    with pytest.raises(ValueError):
+        HashDigest(".", "sha256", 0)
+
+
+@pytest.mark.parametrize("io", IO_MODES)
+def test_io_modes(shared_datadir, io):
+    sizes = {"empty": 0, "small": 100, "large": 300000}
+    for name, size in sizes.items():
+        (shared_datadir / name).write_bytes(bytes(i % 251 for i in range(size)))
+    hasher = HashDigest(shared_datadir, "blake2b", 4096, io, mmap_threshold=200000)
+    for name in sizes:
+        expected = hashlib.blake2b((shared_datadir / name).read_bytes()).hexdigest()
+        assert hasher.digest(name) == expected
+
+
+def test_io_mode_invalid():
+    with pytest.raises(ValueError):
+        HashDigest(".", "sha256", io="bogus")
+
+
+def test_multiple_hashes(shared_datadir):
+    data = b"multiple hashes" * 10000
+    (shared_datadir / "multi").write_bytes(data)
+    hasher = HashDigest(shared_datadir, ["sha256", "blake2b", "SHA256"], 1000)
+    assert hasher.hashes == ["SHA256", "BLAKE2B"]
+    digests = hasher.digests("multi")
+    assert digests == (hashlib.sha256(data).hexdigest(), hashlib.blake2b(data).hexdigest())
+    assert hasher.file_digest("multi").split("\n") == [
+        f"SHA256 (./multi) = {digests[0]}",
+        f"BLAKE2B (./multi) = {digests[1]}",
+    ]
+
+
+def test_multiple_hashes_listing(shared_datadir, tmp_path):
+    sha = shared_datadir / "sha"
+    multi = shared_datadir / "multi"
+    hashtree("/tmp/test/src", None, sha, hash="sha256")
+    hashtree("/tmp/test/src", None, shared_datadir / "md5", hash="md5")
+    hashtree("/tmp/test/src", None, multi, hash=["sha256", "md5"], cache=tmp_path / "cache")
+    lines = multi.read_text().splitlines()
+    assert lines[0::2] == sha.read_text().splitlines()
+    assert lines[1::2] == (shared_datadir / "md5").read_text().splitlines()
+
+    # cached and updated runs give the same listing
+    hashtree("/tmp/test/src", None, shared_datadir / "cached", hash=["sha256", "md5"], cache=tmp_path / "cache")
+    assert (shared_datadir / "cached").read_text() == multi.read_text()
+    hashtree("/tmp/test/src", None, multi, hash=["sha256", "md5"], metadata=True)
+    hashtree("/tmp/test/src", None, shared_datadir / "updated", hash=["sha256", "md5"], update=multi)
+    assert (shared_datadir / "updated").read_text() == multi.read_text()
+
+
+@pytest.mark.parametrize("block_size", [4096, 10000, 1 << 20])
+def test_sparse(shared_datadir, block_size):
+    page = 1 << 16
+    layouts = {
+        "leading_hole": [(3 * page, b"data" * 1000)],
+        "middle_hole": [(0, b"a" * 5000), (8 * page, b"b" * 7000)],
+        "trailing_hole": [(0, b"c" * 100)],
+        "all_hole": [],
+    }
+    for name, extents in layouts.items():
+        with (shared_datadir / name).open("wb") as ofp:
+            for offset, data in extents:
+                ofp.seek(offset)
+                ofp.write(data)
+            ofp.truncate(16 * page)
+    (shared_datadir / "dense").write_bytes(b"dense" * 10000)
+    hasher = HashDigest(shared_datadir, ["sha256", "md5"], block_size, "sparse")
+    for name in list(layouts) + ["dense"]:
+        data = (shared_datadir / name).read_bytes()
+        assert hasher.digests(name) == (hashlib.sha256(data).hexdigest(), hashlib.md5(data).hexdigest())
+    # a hasher that has hashed sparse files can still be sent to worker processes
+    copy = pickle.loads(pickle.dumps(hasher))
+    assert copy.digests("leading_hole") == hasher.digests("leading_hole")
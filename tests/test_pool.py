@@ -0,0 +1,77 @@
+# parallel hashing tests
+
+import itertools
+import threading
+import time
+
+import pytest
+
+from hashtree import hashtree
+from hashtree.pool import EXECUTORS, ordered_map, prefetch
+
+
+def _square(n):
+    time.sleep((n % 3) * 0.001)
+    return n * n
+
+
+@pytest.mark.parametrize("executor", list(EXECUTORS))
+@pytest.mark.parametrize("jobs", [0, 1, 4])
+def test_ordered_map(executor, jobs):
+    items = range(500)
+    assert list(ordered_map(_square, items, jobs, executor)) == [n * n for n in items]
+
+
+def test_ordered_map_lazy():
+    consumed = []
+
+    def source():
+        for n in range(10000):
+            consumed.append(n)
+            yield n
+
+    results = ordered_map(_square, source(), 2, "thread")
+    assert next(results) == 0
+    assert len(consumed) < 100
+    results.close()
+
+
+@pytest.mark.parametrize("executor", list(EXECUTORS))
+def test_parallel_output_order(shared_datadir, executor):
+    base = "/tmp/test/src"
+    serial = shared_datadir / "serial"
+    parallel = shared_datadir / "parallel"
+    hashtree(base, shared_datadir / "files", serial, sort_files=False)
+    hashtree(base, shared_datadir / "files", parallel, sort_files=False, jobs=4, executor=executor)
+    assert parallel.read_text() == serial.read_text()
+
+
+def test_prefetch():
+    assert list(prefetch(range(10000), 2, 16)) == list(range(10000))
+    assert list(prefetch([])) == []
+
+
+def test_prefetch_exception():
+    def source():
+        yield 1
+        raise ValueError("walk failed")
+
+    with pytest.raises(ValueError):
+        list(prefetch(source()))
+
+
+def test_prefetch_close():
+    items = prefetch(itertools.count(), 2, 4)
+    assert next(items) == 0
+    items.close()
+    assert not [t for t in threading.enumerate() if t.name == "hashtree-prefetch"]
+
+
+@pytest.mark.parametrize("sort_files", [True, False])
+def test_stream_output(shared_datadir, sort_files):
+    base = "/tmp/test/src"
+    serial = shared_datadir / "serial"
+    streamed = shared_datadir / "streamed"
+    hashtree(base, None, serial, sort_files=sort_files)
+    hashtree(base, None, streamed, sort_files=sort_files, stream=True, jobs=3)
+    assert streamed.read_text() == serial.read_text()
@@ -0,0 +1,126 @@
+# progress reporting tests
+
+import importlib
+import io
+
+import pytest
+from tqdm import tqdm
+
+from hashtree import clio, hashtree
+from hashtree.cli import file_sizes
+from hashtree.clio import iter_lines
+from hashtree.hash import HashDigest
+from hashtree.progress import BatchedProgress, ProgressReader, background_total
+from hashtree.walk import walk_files
+
+
+class Bar:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, count):
+        self.updates.append(count)
+
+
+def test_batched_progress():
+    bar = Bar()
+    progress = BatchedProgress(bar, interval=3600)
+    for _ in range(1000):
+        progress.update(10)
+    assert bar.updates == []
+    progress.flush()
+    assert bar.updates == [10000]
+
+    progress = BatchedProgress(bar, interval=0)
+    progress.update(5)
+    progress.update(7)
+    assert bar.updates == [10000, 5, 7]
+
+
+def test_file_sizes(tmp_path):
+    for name, size in [("a", 10), ("b", 0), ("c", 1000)]:
+        (tmp_path / name).write_bytes(b"x" * size)
+    assert list(file_sizes(tmp_path, [("a", None), ("b", None), ("c", None), ("missing", None)])) == [10, 0, 1000]
+
+
+def test_background_total():
+    with tqdm(total=None, file=io.StringIO()) as bar:
+        with background_total(bar, iter([10, 0, 1000]), interval=0) as thread:
+            thread.join()
+        assert bar.total == 1010
+
+
+def test_progress_bytes_walk_is_lazy(write_tree, tmp_path, monkeypatch):
+    base = write_tree({f"f{index:02}": "x" * index for index in range(50)})
+    walked = []
+    seen = []
+    digests = HashDigest.digests
+
+    def walk(base, sort=True):
+        for item in walk_files(base, sort):
+            if sort:
+                walked.append(item[0])
+            yield item
+
+    def recording(self, filename):
+        seen.append(len(walked))
+        return digests(self, filename)
+
+    monkeypatch.setattr(importlib.import_module("hashtree.cli"), "walk_files", walk)
+    monkeypatch.setattr(HashDigest, "digests", recording)
+    hashtree(base, None, tmp_path / "sums", progress=True, progress_unit="bytes")
+    # the hashing walk is consumed as files are hashed, not listed up front
+    assert seen[0] == 1
+    assert len(walked) == 50
+
+
+def test_progress_bytes(write_tree, tmp_path):
+    base = write_tree({f"d{index % 2}/f{index}": b"x" * index * 100 for index in range(20)})
+    files = tmp_path / "files"
+    hashtree(base, None, tmp_path / "expected")
+    hashtree(base, files, tmp_path / "walked", progress=True, progress_unit="bytes")
+    hashtree(base, files, tmp_path / "listed", find=False, progress=True, progress_unit="bytes", jobs=2)
+    expected = (tmp_path / "expected").read_text()
+    assert (tmp_path / "walked").read_text() == expected
+    assert (tmp_path / "listed").read_text() == expected
+
+
+@pytest.mark.parametrize("separator", ["\n", "\0"])
+@pytest.mark.parametrize("seekable", [True, False])
+def test_progress_reader(separator, seekable):
+    names = ["./a", "./b c", "", "./new\nline" if separator == "\0" else "./d", "./é"] * 300
+    text = separator.join(names)
+    stream = io.StringIO(text)
+    if not seekable:
+        stream.seekable = lambda: False
+    with ProgressReader(stream, separator, file=io.StringIO()) as reader:
+        assert list(reader.readlines()) == names
+        assert reader.tqdm.n == (len(text) + 1 if seekable else len(names))
+
+
+def test_iter_lines_chunks(monkeypatch):
+    monkeypatch.setattr(clio, "READ_CHUNK", 3)
+    assert list(iter_lines(io.StringIO("ab\0cdefg\0\0h"), "\0")) == ["ab", "cdefg", "", "h"]
+    assert list(iter_lines(io.StringIO("ab\ncd\n"))) == ["ab", "cd"]
+
+
+def test_null_file_list(write_tree, tmp_path):
+    base = write_tree({name: name for name in ["b", "new\nline", "a", "c\rr", "c\r\nrn"]})
+    files = tmp_path / "files"
+    files.write_bytes(b"./b\0./new\nline\0./a\0./c\rr\0./c\r\nrn\0")
+    output = tmp_path / "sums"
+    hashtree(base, files, output, find=False, null=True)
+    lines = output.read_bytes().decode().split("\n")
+    assert [line.split(")")[0] for line in lines if line.startswith("SHA")] == [
+        "SHA256 (./a",
+        "SHA256 (./b",
+        "SHA256 (./c\rr",
+        "SHA256 (./c\r",
+        "SHA256 (./new",
+    ]
+    assert files.read_bytes() == b"./a\0./b\0./c\rr\0./c\r\nrn\0./new\nline\0"
+
+    # unsorted, straight from the list
+    files.write_bytes(b"./c\rr\0./c\r\nrn\0")
+    hashtree(base, files, output, find=False, null=True, sort_files=False)
+    assert output.read_bytes().count(b"SHA256 (./c\r") == 2
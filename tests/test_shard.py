@@ -0,0 +1,63 @@
+# sharding and merge tests
+
+import pytest
+from click.testing import CliRunner
+
+from hashtree import cli, hashtree, merge_shards
+from hashtree.shard import parse_shard, shard_of
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree(
+        {f"d{index % 3}/{'F' if index % 2 else 'f'}/{index}.txt": str(index) * index for index in range(40)}
+    )
+
+
+def test_parse_shard():
+    assert parse_shard("2/3") == (2, 3)
+    for value in ["0/3", "4/3", "3", "a/b"]:
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_shard_of_is_stable():
+    assert shard_of("a/b", 4) == shard_of("./a/b", 4)
+    assert {shard_of(f"./{index}", 4) for index in range(100)} == {1, 2, 3, 4}
+
+
+@pytest.mark.parametrize("sort_output", [False, True])
+@pytest.mark.parametrize("find", [True, False])
+def test_shards_merge_to_single_run(tree, tmp_path, sort_output, find):
+    options = dict(hash=["sha256", "md5"], sort_output=sort_output, find=find)
+    infile = None
+    if not find:
+        infile = tmp_path / "files"
+        infile.write_text("".join(f"./{path.relative_to(tree)}\n" for path in tree.rglob("*.txt")))
+    hashtree(tree, infile, tmp_path / "single", **options)
+
+    shards = []
+    for index in range(1, 4):
+        shards.append(tmp_path / f"shard{index}")
+        hashtree(tree, infile, shards[-1], shard=f"{index}/3", **options)
+        assert shards[-1].read_text()
+    assert sum(len(shard.read_text().splitlines()) for shard in shards) == 80
+
+    merge_shards(tmp_path / "merged", merge=shards, sort_output=sort_output)
+    assert (tmp_path / "merged").read_text() == (tmp_path / "single").read_text()
+
+
+def test_shard_rejects_tree(tree, tmp_path):
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, tmp_path / "sums", shard="1/2", tree=tmp_path / "tree.sums")
+
+
+def test_merge_output_as_only_argument(tree, tmp_path):
+    shards = [tmp_path / f"shard{index}" for index in (1, 2)]
+    for index, shard in enumerate(shards, 1):
+        hashtree(tree, None, shard, shard=f"{index}/2")
+    hashtree(tree, None, tmp_path / "single")
+    merged = tmp_path / "merged"
+    result = CliRunner().invoke(cli, ["--merge", str(shards[0]), "--merge", str(shards[1]), str(merged)])
+    assert result.exit_code == 0, result.output
+    assert merged.read_text() == (tmp_path / "single").read_text()
@@ -0,0 +1,95 @@
+# in-process external sort tests
+
+import io
+import random
+import subprocess
+
+from click.testing import CliRunner
+
+from hashtree import cli
+from hashtree.cli import DEFAULT_SORT_ARGS, sort_file
+from hashtree.sort import MERGE_WIDTH, SortedWriter, sort_key, sort_lines
+
+
+def system_sort(lines):
+    output = subprocess.check_output(
+        ["sort", "-ifdk1.1"], input="\n".join(lines) + "\n", text=True, env={"LC_ALL": "C"}
+    )
+    return output.splitlines()
+
+
+def random_lines(count, seed=0):
+    rng = random.Random(seed)
+    chars = "aAbBzZ09 ._-/é"
+    return ["./" + "".join(rng.choice(chars) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+def test_sort_lines_in_memory():
+    lines = random_lines(500)
+    assert list(sort_lines(lines)) == system_sort(lines)
+
+
+def test_sort_lines_spilled(tmp_path):
+    lines = random_lines(2000)
+    # a tiny memory limit spills every few lines and forces intermediate merges
+    result = list(sort_lines(lines, memory=1000, temp_dir=tmp_path))
+    assert len(lines) // 5 > MERGE_WIDTH
+    assert result == sorted(lines, key=sort_key)
+    assert result == system_sort(lines)
+    assert not list(tmp_path.iterdir())
+
+
+def test_sort_file(tmp_path):
+    lines = random_lines(300)
+    listing = tmp_path / "files"
+    listing.write_text("\n".join(lines) + "\n")
+    sort_file(listing, DEFAULT_SORT_ARGS, memory=2000, temp_dir=tmp_path)
+    assert listing.read_text().splitlines() == system_sort(lines)
+
+
+def test_sort_output_temp_dir(tmp_path):
+    src = tmp_path / "src"
+    for name in ["b", "A", "c/d", "_z"]:
+        path = src / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    outfile = tmp_path / "sums"
+    result = CliRunner().invoke(
+        cli, ["-b", str(src), "-F", "-o", "-K", "64", "-D", str(temp_dir), "-", str(outfile)], input="./c/d\n./b\n./A\n"
+    )
+    assert result.exit_code == 0, result.output
+    paths = [line.split("(")[1].split(")")[0] for line in outfile.read_text().splitlines()]
+    assert paths == ["./A", "./b", "./c/d"]
+    # spooled input and unsorted output go to the temp dir, removed at exit
+    assert all(path.name.startswith("hashtree_file_list") for path in temp_dir.iterdir())
+    assert list(temp_dir.iterdir())
+
+
+def test_sorted_writer():
+    paths = system_sort(random_lines(500) + ["./a.b", "./ab", "./a\tb", "./a", "./A"])
+    lines = [f"SHA256 ({path}) = {index:04x}" for index, path in enumerate(paths)]
+    output = io.StringIO()
+    writer = SortedWriter(output)
+    for path, line in zip(paths, lines):
+        writer.write(line, f"SHA256 ({path}")
+    writer.flush()
+    assert output.getvalue().splitlines() == system_sort(lines)
+
+
+def test_sort_output_presorted(tmp_path):
+    src = tmp_path / "src"
+    for name in ["b", "A", "a.b", "ab", "a\tb", "c/d", "_z", "C", "cd"]:
+        path = src / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    outfile = tmp_path / "sums"
+    result = CliRunner().invoke(cli, ["-b", str(src), "-o", "-D", str(temp_dir), "-", str(outfile)])
+    assert result.exit_code == 0, result.output
+    lines = outfile.read_text().splitlines()
+    assert lines == system_sort(lines)
+    # written directly, with no spooled copy to sort
+    assert not list(temp_dir.iterdir())
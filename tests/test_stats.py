@@ -0,0 +1,64 @@
+# run statistics tests
+
+import json
+import os
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from hashtree import cli, hashtree
+from hashtree.stats import RunStats
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({f"f{index}": b"x" * size for index, size in enumerate([0, 1, 1000, 5000, 100000])})
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_stats_report(tree, tmp_path, executor):
+    # a hard link is listed and counted, but its contents are read only once
+    os.link(tree / "f4", tree / "linked")
+    report_file = tmp_path / "stats.json"
+    hashtree(tree, None, tmp_path / "sums", jobs=2, executor=executor, stats=report_file)
+    report = json.loads(report_file.read_text())
+    assert (report["files"], report["bytes"], report["hashed"], report["cached"]) == (6, 206001, 5, 0)
+    assert {"walk", "hash", "write"} <= set(report["stages"])
+    assert report["sizes"] == {"0": 1, "1": 1, "1024": 1, "8192": 1, "131072": 2}
+    slowest = report["slowest"]
+    assert sorted(entry["path"] for entry in slowest) == [f"./f{index}" for index in range(5)]
+    assert [entry["seconds"] for entry in slowest] == sorted((entry["seconds"] for entry in slowest), reverse=True)
+    assert report["file_seconds"] > 0
+
+
+def test_stats_counts_cache_hits_and_stderr(tree, tmp_path, capsys):
+    cache = tmp_path / "cache.db"
+    hashtree(tree, None, tmp_path / "sums", cache=cache)
+    hashtree(tree, None, tmp_path / "sums", cache=cache, stats="-")
+    report = json.loads(capsys.readouterr().err)
+    assert (report["cached"], report["hashed"], report["slowest"]) == (5, 0, [])
+
+
+def test_stats_stages_do_not_overlap():
+    stats = RunStats()
+
+    def walk():
+        for _ in range(3):
+            time.sleep(0.02)
+            yield None
+
+    for _ in stats.timed_iter("hash", stats.timed_iter("walk", walk())):
+        with stats.stage("write"):
+            time.sleep(0.01)
+    assert stats.stages["walk"] >= 0.06
+    assert stats.stages["hash"] < 0.02
+    assert stats.stages["write"] >= 0.03
+
+
+@pytest.mark.parametrize("mode", [["--duplicates"], ["--check", "f0"], ["--merge", "f0"], ["--watch", "1"]])
+def test_stats_rejected_outside_hashing(tree, mode, monkeypatch):
+    monkeypatch.chdir(tree)
+    result = CliRunner().invoke(cli, [*mode, "--stats"])
+    assert result.exit_code == 2
+    assert f"--stats cannot be used with {mode[0]}" in result.output
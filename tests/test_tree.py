@@ -0,0 +1,57 @@
+# Merkle tree digest tests
+
+import hashlib
+import shutil
+
+import pytest
+
+from hashtree import hashtree
+from hashtree.check import parse_digest_line
+from hashtree.tree import MerkleTree
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name for name in ["a", "b/c", "b/d/e", "b/d/f", "g/h"]})
+
+
+def tree_digests(root, output):
+    hashtree(root, None, output.with_suffix(".sums"), tree=output)
+    return {path: digest for _, path, digest in map(parse_digest_line, output.read_text().splitlines())}
+
+
+def test_merkle_root():
+    digest = hashlib.sha256(b"x").hexdigest()
+    merkle = MerkleTree("sha256")
+    merkle.add("./x", digest)
+    expected = hashlib.sha256(b"f x\0" + bytes.fromhex(digest)).hexdigest()
+    assert merkle.digests() == [("./", expected)]
+    assert merkle.digests() == [("./", expected)]
+
+
+def test_merkle_empty(write_tree, tmp_path):
+    empty = [("./", hashlib.sha256().hexdigest())]
+    assert MerkleTree("sha256").digests() == empty
+    assert tree_digests(write_tree({}), tmp_path / "empty") == dict(empty)
+
+
+def test_tree_output(tree, tmp_path):
+    digests = tree_digests(tree, tmp_path / "first")
+    assert list(digests) == ["./", "./b/", "./b/d/", "./g/"]
+
+    # identical content in another location gives identical digests
+    shutil.copytree(tree, tmp_path / "copy")
+    assert tree_digests(tmp_path / "copy", tmp_path / "second") == digests
+
+
+def test_tree_changes(tree, tmp_path):
+    before = tree_digests(tree, tmp_path / "before")
+    (tree / "b" / "d" / "e").write_text("changed")
+    after = tree_digests(tree, tmp_path / "after")
+    assert [path for path in before if before[path] != after[path]] == ["./", "./b/", "./b/d/"]
+
+    (tree / "b" / "d" / "e").write_text("b/d/e")
+    (tree / "b" / "d" / "e").rename(tree / "b" / "d" / "z")
+    renamed = tree_digests(tree, tmp_path / "renamed")
+    assert renamed["./g/"] == before["./g/"]
+    assert renamed["./b/d/"] != before["./b/d/"]
@@ -0,0 +1,110 @@
+# incremental update tests
+
+import importlib
+import os
+
+import pytest
+
+from hashtree import hashtree
+from hashtree.cache import ListingCache, SortedLookup, sidecar_path
+from hashtree.hash import HashDigest
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name for name in ["a", "b", "c", "d/e", "d/f"]})
+
+
+def test_sorted_lookup():
+    lookup = SortedLookup([("./a", 1), ("./b", 2), ("./c", 3), ("./d", 4)])
+    assert lookup.get("./b") == 2
+    assert lookup.get("./bb") is None
+    assert lookup.get("./a") == 1
+    assert lookup.get("./d") == 4
+    assert lookup.get("./c") == 3
+    assert lookup.get("./e") is None
+
+
+def test_update(tree, tmp_path):
+    old = tmp_path / "old"
+    new = tmp_path / "new"
+    full = tmp_path / "full"
+    hashtree(tree, None, old, metadata=True)
+    assert len(sidecar_path(old).read_text().splitlines()) == 5
+
+    (tree / "b").write_text("changed")
+    (tree / "c").unlink()
+    (tree / "d" / "g").write_text("new")
+    hashtree(tree, None, new, update=old)
+    hashtree(tree, None, full)
+    assert new.read_text() == full.read_text()
+    assert sidecar_path(new).is_file()
+
+    with ListingCache(new, tree) as cache:
+        hasher = HashDigest(tree)
+        files = [("./a", None), ("./b", None), ("./d/e", None)]
+        assert [digest for _, _, digest in cache.file_digests(hasher, files)] == [
+            hasher.digests(path) for path, _ in files
+        ]
+        assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_update_detects_same_size_change(tree, tmp_path):
+    listing = tmp_path / "listing"
+    hashtree(tree, None, listing, metadata=True)
+    stat = (tree / "a").stat()
+    (tree / "a").write_text("A")
+    os.utime(tree / "a", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    hashtree(tree, None, listing, update=listing)
+    hashtree(tree, None, tmp_path / "full")
+    assert listing.read_text() == (tmp_path / "full").read_text()
+
+
+def test_update_without_sidecar(tree, tmp_path):
+    old = tmp_path / "old"
+    hashtree(tree, None, old)
+    old.write_text(old.read_text().replace("SHA256 (./a) = ", "SHA256 (./a) = 00"))
+    hashtree(tree, None, tmp_path / "new", update=old)
+    hashtree(tree, None, tmp_path / "full")
+    assert (tmp_path / "new").read_text() == (tmp_path / "full").read_text()
+
+
+def test_update_exclusive(tree, tmp_path):
+    hashtree(tree, None, tmp_path / "old")
+    with pytest.raises(RuntimeError):
+        hashtree(tree, None, tmp_path / "new", update=tmp_path / "old", cache=tmp_path / "cache")
+
+
+def test_update_interrupted_keeps_sidecar_with_listing(tree, tmp_path, monkeypatch):
+    listing = tmp_path / "listing"
+    hashtree(tree, None, listing, metadata=True)
+    before = (listing.read_text(), sidecar_path(listing).read_text())
+    (tree / "b").write_text("changed")
+
+    # the run dies after hashing, before the listing is replaced
+    def interrupted(*args):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(importlib.import_module("hashtree.cli"), "place_listing", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            hashtree(tree, None, listing, update=listing)
+    assert (listing.read_text(), sidecar_path(listing).read_text()) == before
+
+    hashtree(tree, None, listing, update=listing)
+    hashtree(tree, None, tmp_path / "full")
+    assert listing.read_text() == (tmp_path / "full").read_text()
+
+
+def test_update_in_place_presorted(tree, tmp_path, monkeypatch):
+    listing = tmp_path / "listing"
+    hashtree(tree, None, listing, metadata=True, sort_output=True)
+    (tree / "b").write_text("changed")
+
+    def second_pass(*args):
+        raise AssertionError("presorted output sorted again")
+
+    monkeypatch.setattr(importlib.import_module("hashtree.cli"), "write_sorted_output", second_pass)
+    hashtree(tree, None, listing, update=listing, sort_output=True)
+    hashtree(tree, None, tmp_path / "full", sort_output=True)
+    assert listing.read_text() == (tmp_path / "full").read_text()
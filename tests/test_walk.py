@@ -0,0 +1,51 @@
+# in-process walker tests
+
+import subprocess
+
+import pytest
+
+from hashtree.sort import sort_key
+from hashtree.walk import walk_files
+
+NAMES = ["a/z", "ab", "a/0", "A-b/c", "a_b", "B", "b.txt", "b/.hidden", "x y/1", "x/y1", "_", "é", "a/b/c/d/e"]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in NAMES:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+    (tmp_path / "link").symlink_to(tmp_path / "ab")
+    (tmp_path / "dirlink").symlink_to(tmp_path / "a")
+    return tmp_path
+
+
+def sort_lines(lines):
+    output = subprocess.check_output(
+        ["sort", "-ifdk1.1"], input="\n".join(lines) + "\n", text=True, env={"LC_ALL": "C"}
+    )
+    return output.splitlines()
+
+
+def test_sort_key():
+    lines = ["./" + name for name in NAMES] + ["./a/bc", "./ab/c", "./Ab/c", "./a\tb", "./A b"]
+    assert sorted(lines, key=sort_key) == sort_lines(lines)
+
+
+def test_walk_unsorted(tree):
+    found = subprocess.check_output(["find", ".", "-type", "f"], cwd=tree, text=True).splitlines()
+    assert [path for path, _ in walk_files(tree, sort=False)] == found
+
+
+def test_walk_sorted(tree):
+    found = subprocess.check_output(["find", ".", "-type", "f"], cwd=tree, text=True).splitlines()
+    walked = [path for path, _ in walk_files(tree)]
+    assert walked == sort_lines(found)
+    assert walked != sorted(walked)
+
+
+def test_walk_entries(tree):
+    for path, entry in walk_files(tree):
+        assert (tree / path).samefile(entry.path)
+        assert entry.stat().st_size == len(path[2:].encode())
@@ -0,0 +1,108 @@
+# watch mode tests
+
+import ctypes
+import errno
+import importlib
+import queue
+import shutil
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from hashtree import cli
+from hashtree.hash import HashDigest
+from hashtree.watch import DigestIndex, InotifyWatcher, replace_listing, watch_tree
+
+
+@pytest.fixture
+def tree(write_tree):
+    return write_tree({name: name for name in ["a", "b/c", "b/d/e"]})
+
+
+def listed(lines):
+    return [line.split("(")[1].split(")")[0] for line in lines]
+
+
+def test_digest_index(tree):
+    hasher = HashDigest(tree)
+    index = DigestIndex(tree, hasher)
+    index.scan()
+    assert listed(index.lines()) == ["./a", "./b/c", "./b/d/e"]
+    assert index.lines()[0] == hasher.file_digest("a")
+
+    index.changed = False
+    index.refresh(["./a", "./b/c"])
+    assert not index.changed
+
+    (tree / "a").write_text("changed")
+    (tree / "b/c").unlink()
+    index.refresh(["./a", "./b/c"])
+    assert index.changed
+    assert listed(index.lines()) == ["./a", "./b/d/e"]
+    assert index.lines()[0] == hasher.file_digest("a")
+
+    shutil.rmtree(tree / "b")
+    (tree / "f").mkdir()
+    (tree / "f/g").write_text("g")
+    index.refresh(["./b", "./f"])
+    assert listed(index.lines()) == ["./a", "./f/g"]
+
+
+def test_replace_listing(tmp_path):
+    output = tmp_path / "sums"
+    output.write_text("old\n")
+    replace_listing(output, ["one", "two"])
+    assert output.read_text() == "one\ntwo\n"
+    assert [path.name for path in tmp_path.iterdir()] == ["sums"]
+
+
+no_inotify = pytest.mark.skipif(not InotifyWatcher.available(), reason="inotify not available")
+
+
+@pytest.mark.parametrize("poll", [True, pytest.param(False, marks=no_inotify)])
+def test_watch_tree(tree, poll):
+    flushes = queue.Queue()
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=watch_tree, args=(tree, HashDigest(tree), flushes.put, 0.05), kwargs=dict(stop=stop, poll=poll)
+    )
+    watcher.start()
+    try:
+        assert listed(flushes.get(timeout=10)) == ["./a", "./b/c", "./b/d/e"]
+        (tree / "b/d/new").write_text("new")
+        (tree / "a").unlink()
+        (tree / "h/i").mkdir(parents=True)
+        (tree / "h/i/j").write_text("j")
+        expected = ["./b/c", "./b/d/e", "./b/d/new", "./h/i/j"]
+        while listed(lines := flushes.get(timeout=10)) != expected:
+            pass
+        assert lines[2] == HashDigest(tree).file_digest("b/d/new")
+    finally:
+        stop.set()
+        watcher.join()
+
+
+@no_inotify
+@pytest.mark.parametrize("error, polling", [(errno.ENOENT, False), (errno.ENOSPC, True)])
+def test_inotify_failed_watch(tree, error, polling):
+    def add_watch(fd, path, mask):
+        ctypes.set_errno(error)
+        return -1
+
+    with InotifyWatcher(tree) as watcher:
+        watcher._add_watch = add_watch
+        watcher.add_tree()
+        assert watcher.dirs == {}
+        assert watcher.polling == polling
+        assert (watcher.wait(0.01, threading.Event()) is None) == polling
+
+
+def test_watch_listing_as_only_argument(tree, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(importlib.import_module("hashtree.cli"), "watch_tree", lambda *args: calls.append(args))
+    listing = tmp_path / "listing"
+    result = CliRunner().invoke(cli, ["-b", str(tree), "--watch", "1", str(listing)])
+    assert result.exit_code == 0, result.output
+    base, _, flush, interval, _, _ = calls[0]
+    assert (base, interval, flush.args) == (tree, 1, (str(listing),))